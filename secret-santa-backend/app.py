@@ -1,6 +1,11 @@
 import os
-from flask import Flask, request, jsonify
+from functools import lru_cache
+from operator import attrgetter
+from flask import Blueprint, Flask, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.routing import BaseConverter
+import fast_json
 from models import Participant, Gift
 from error_handlers import (
     register_error_handlers, 
@@ -8,16 +13,51 @@ from error_handlers import (
     validate_participant_name,
     validate_gift_name,
     validate_participant_id,
+    now_iso,
     APIError
 )
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes and decodes through fast_json (orjson when available)."""
+    
+    def dumps(self, obj, **kwargs):
+        return fast_json.dumps(obj, default=self.default).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        return fast_json.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(fast_json.dumps(obj, default=self.default), mimetype=self.mimetype)
+
+
+class GiftIdConverter(BaseConverter):
+    """
+    URL converter for gift IDs (hex strings, UUIDs in older data).
+    
+    IDs with other characters or over 64 characters never match a route. An
+    empty segment does match, so it can be rejected with INVALID_GIFT_ID
+    instead of a bare 404.
+    """
+    regex = r'[A-Za-z0-9_-]{0,64}'
+
+
+app = Flask(__name__, static_folder=None)  # API only; no /static/<filename> rule to match against
+app.json = FastJSONProvider(app)  # jsonify() and request.get_json() go through fast_json
+if 'AWS_LAMBDA_FUNCTION_NAME' not in os.environ:
+    # Under Lambda the handler adds the CORS headers to every response itself,
+    # so Flask-CORS's per-response hook would only be wasted work there
+    CORS(app)  # Enable CORS for all routes
+app.url_map.converters['gid'] = GiftIdConverter
 
 # Initialize database based on environment
 if os.environ.get('USE_S3_DATABASE') == 'true':
     from s3_database import S3Database, DatabaseError, ConcurrentAccessError
     db = S3Database()
+    # A version check leaves the body it validated for the request's read;
+    # drop it when the request ends so a later request can't be served it
+    app.teardown_request(lambda exc: db.end_request())
 else:
     from database import FileDatabase, DatabaseError, ConcurrentAccessError
     db = FileDatabase()
@@ -25,14 +65,112 @@ else:
 # Register error handlers
 register_error_handlers(app)
 
+# One blueprint per resource; registered at the bottom of the module once
+# their routes are defined, static routes ahead of <gift_id> ones
+participants_bp = Blueprint('participants', __name__, url_prefix='/api/participants')
+gifts_bp = Blueprint('gifts', __name__, url_prefix='/api/gifts')
+game_bp = Blueprint('game', __name__, url_prefix='/api/game')
+
+
+@gifts_bp.url_value_preprocessor
+def _validate_gift_id(endpoint, values):
+    """Reject an empty gift ID for every /api/gifts/<gift_id>/... route."""
+    if values is not None and values.get('gift_id') == '':
+        raise APIError(
+            'Invalid gift ID',
+            status_code=400,
+            error_code='INVALID_GIFT_ID'
+        )
+
+# Constant parts of the GET /api/participants/count response body
+_COUNT_PREFIX = b'{"count":'
+_COUNT_SUFFIX = b',"max_participants":100}'
+
+
+def _get_snapshot():
+    """
+    Get the database snapshot for the current request.
+    
+    The database is read at most once per request; subsequent callers within
+    the same request reuse the already deserialized objects stored on flask.g.
+    """
+    snapshot = g.get('snapshot')
+    if snapshot is None:
+        snapshot = g.snapshot = db.read_all_data()
+    return snapshot
+
+
+def _state_etag():
+    """
+    Get the entity tag for the current database state.
+    
+    The version is taken before the data is read, so a concurrent write can
+    only make the tag older than the body (causing a harmless full response
+    on the next poll), never newer.
+    """
+    return str(db.get_version())
+
+
+def _not_modified(etag):
+    """Build an empty 304 response carrying the given weak ETag."""
+    response = app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    return response
+
+
+@lru_cache(maxsize=None)
+def _gift_result_prefix(success, message):
+    """Pre-encode the constant head of a {"success", "message", "gift"} body."""
+    head = fast_json.dumps({"success": success, "message": message})
+    return head[:-1] + b',"gift":'
+
+
+def _gift_result_response(success, message, gift):
+    """
+    Build the response shared by the steal, rename and reset-steals endpoints.
+    
+    Every message is a fixed string, so only the gift itself is encoded per
+    request; the rest of the body comes from a cached byte prefix.
+    
+    Args:
+        success: Whether the operation succeeded
+        message: Fixed message describing the outcome
+        gift: Gift as it stands after the operation
+    
+    Returns:
+        JSON response
+    """
+    body = _gift_result_prefix(success, message) + fast_json.dumps(gift.to_dict()) + b'}'
+    return app.response_class(body, mimetype='application/json')
+
+
+def _current_participant_dict(participants, game_state):
+    """
+    Get the serialized participant whose turn it currently is.
+    
+    Args:
+        participants: List of registered participants
+        game_state: Current game state
+        
+    Returns:
+        Participant dictionary, or None if no participant holds the turn
+    """
+    if game_state.current_turn is None:
+        return None
+    
+    participants_by_id = {p.id: p for p in participants}
+    current = participants_by_id.get(game_state.current_turn)
+    return current.to_dict() if current is not None else None
+
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    from datetime import datetime
-    return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
+    return jsonify({"status": "healthy", "timestamp": now_iso()})
 
 
-@app.route('/api/participants', methods=['POST'])
+@participants_bp.route('', methods=['POST'])
 @validate_json_request(required_fields=['name'])
 def register_participant():
     """
@@ -50,7 +188,7 @@ def register_participant():
         "registration_timestamp": "ISO_datetime"
     }
     """
-    data = request.get_json()
+    data = g.json
     
     # Validate and clean name
     name = validate_participant_name(data['name'])
@@ -61,7 +199,7 @@ def register_participant():
     return jsonify(participant.to_dict()), 201
 
 
-@app.route('/api/participants', methods=['GET'])
+@participants_bp.route('', methods=['GET'])
 def get_participants():
     """
     Get all registered participants.
@@ -77,17 +215,24 @@ def get_participants():
         ]
     }
     """
+    etag = _state_etag()
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    
     participants = db.get_participants()
     
-    # Sort participants by ID for consistent ordering
-    participants.sort(key=lambda p: p.id)
+    # Sort participants by ID for consistent ordering (the database stores
+    # them in ID order, so this is a linear pass in the common case)
+    participants.sort(key=attrgetter('id'))
     
-    return jsonify({
+    response = jsonify({
         "participants": [p.to_dict() for p in participants]
-    }), 200
+    })
+    response.set_etag(etag, weak=True)
+    return response, 200
 
 
-@app.route('/api/participants/count', methods=['GET'])
+@participants_bp.route('/count', methods=['GET'])
 def get_participant_count():
     """
     Get the current number of registered participants.
@@ -100,13 +245,12 @@ def get_participant_count():
     """
     count = db.get_participant_count()
     
-    return jsonify({
-        "count": count,
-        "max_participants": 100
-    }), 200
+    # Only the count varies, so splice it between pre-encoded fragments
+    body = _COUNT_PREFIX + str(int(count)).encode('ascii') + _COUNT_SUFFIX
+    return app.response_class(body, mimetype='application/json'), 200
 
 
-@app.route('/api/gifts', methods=['POST'])
+@gifts_bp.route('', methods=['POST'])
 @validate_json_request(required_fields=['name'])
 def add_gift():
     """
@@ -128,7 +272,7 @@ def add_gift():
         "steal_history": []
     }
     """
-    data = request.get_json()
+    data = g.json
     
     # Validate and clean gift name
     name = validate_gift_name(data['name'])
@@ -144,7 +288,7 @@ def add_gift():
     return jsonify(gift.to_dict()), 201
 
 
-@app.route('/api/gifts', methods=['GET'])
+@gifts_bp.route('', methods=['GET'])
 def get_gifts():
     """
     Get all gifts with steal status information.
@@ -163,14 +307,20 @@ def get_gifts():
         ]
     }
     """
+    etag = _state_etag()
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
+    
     gifts = db.get_gifts()
     
-    return jsonify({
-        "gifts": [g.to_dict() for g in gifts]
-    }), 200
+    response = jsonify({
+        "gifts": [gift.to_dict() for gift in gifts]
+    })
+    response.set_etag(etag, weak=True)
+    return response, 200
 
 
-@app.route('/api/gifts/<gift_id>/steal', methods=['PUT'])
+@gifts_bp.route('/<gid:gift_id>/steal', methods=['PUT'])
 @validate_json_request(required_fields=['new_owner_id'])
 def steal_gift(gift_id):
     """
@@ -195,36 +345,13 @@ def steal_gift(gift_id):
         }
     }
     """
-    data = request.get_json()
-    
-    # Validate gift_id
-    if not gift_id or not isinstance(gift_id, str):
-        raise APIError(
-            'Invalid gift ID',
-            status_code=400,
-            error_code='INVALID_GIFT_ID'
-        )
+    data = g.json
     
     # Validate new_owner_id
     new_owner_id = validate_participant_id(data['new_owner_id'])
     
-    # Attempt to steal the gift
-    success = db.steal_gift_atomic(gift_id, new_owner_id)
-    
-    # Get updated gift information
-    gifts = db.get_gifts()
-    updated_gift = None
-    for g in gifts:
-        if g.id == gift_id:
-            updated_gift = g
-            break
-    
-    if not updated_gift:
-        raise APIError(
-            'Gift not found',
-            status_code=404,
-            error_code='GIFT_NOT_FOUND'
-        )
+    # Attempt to steal the gift (raises DatabaseError if it doesn't exist)
+    success, updated_gift = db.steal_gift_atomic(gift_id, new_owner_id, return_gift=True)
     
     if success:
         message = "Gift stolen successfully"
@@ -233,14 +360,10 @@ def steal_gift(gift_id):
     else:
         message = "Gift cannot be stolen - it is locked"
     
-    return jsonify({
-        "success": success,
-        "message": message,
-        "gift": updated_gift.to_dict()
-    }), 200
+    return _gift_result_response(success, message, updated_gift), 200
 
 
-@app.route('/api/gifts/<gift_id>/name', methods=['PUT'])
+@gifts_bp.route('/<gid:gift_id>/name', methods=['PUT'])
 @validate_json_request(required_fields=['name'])
 def update_gift_name(gift_id):
     """
@@ -265,15 +388,7 @@ def update_gift_name(gift_id):
         }
     }
     """
-    data = request.get_json()
-    
-    # Validate gift_id
-    if not gift_id or not isinstance(gift_id, str):
-        raise APIError(
-            'Invalid gift ID',
-            status_code=400,
-            error_code='INVALID_GIFT_ID'
-        )
+    data = g.json
     
     # Validate and clean gift name
     new_name = validate_gift_name(data['name'])
@@ -281,14 +396,41 @@ def update_gift_name(gift_id):
     # Update the gift name atomically
     updated_gift = db.update_gift_name_atomic(gift_id, new_name)
     
-    return jsonify({
-        "success": True,
-        "message": "Gift name updated successfully",
-        "gift": updated_gift.to_dict()
-    }), 200
+    return _gift_result_response(True, "Gift name updated successfully", updated_gift), 200
 
 
-@app.route('/api/game/current-turn', methods=['GET'])
+@gifts_bp.route('/<gid:gift_id>/reset-steals', methods=['PUT'])
+def reset_gift_steals(gift_id):
+    """
+    Reset a gift's steal count to 0 (admin override).
+    This also unlocks the gift.
+    
+    Returns:
+    {
+        "success": boolean,
+        "message": "description",
+        "gift": {
+            "id": "gift_id",
+            "name": "gift_name",
+            "steal_count": 0,
+            "is_locked": false,
+            "current_owner": owner_id_or_null,
+            "steal_history": [previous_owner_ids]
+        }
+    }
+    """
+    # Reset the gift's steal count (raises DatabaseError if it doesn't exist)
+    was_reset, updated_gift = db.reset_gift_steals_atomic(gift_id, return_gift=True)
+    
+    if was_reset:
+        message = "Gift steal count reset to 0 and unlocked - can be stolen again!"
+    else:
+        message = "Gift already has 0 steals and is unlocked"
+    
+    return _gift_result_response(True, message, updated_gift), 200
+
+
+@game_bp.route('/current-turn', methods=['GET'])
 def get_current_turn():
     """
     Get the current turn information.
@@ -305,40 +447,36 @@ def get_current_turn():
         "total_participants": number
     }
     """
-    participants, _, game_state = db.read_all_data()
+    etag = _state_etag()
+    if request.if_none_match.contains_weak(etag):
+        return _not_modified(etag)
     
-    # Find current participant details
-    current_participant = None
-    if game_state.current_turn is not None:
-        for p in participants:
-            if p.id == game_state.current_turn:
-                current_participant = p.to_dict()
-                break
-    
-    # If game hasn't started but we have participants, set up turn order
+    snapshot = _get_snapshot()
+    participants, game_state = snapshot.participants, snapshot.game_state
+    
+    # If game hasn't started but we have participants, preview the turn order.
+    # This is not persisted: start_game is the only writer of the turn order,
+    # which keeps this polled endpoint read-only.
     if game_state.game_phase == "registration" and participants and not game_state.turn_order:
         # Sort participants by ID for consistent turn order
-        participant_ids = sorted([p.id for p in participants])
+        participant_ids = sorted(map(attrgetter('id'), participants))
         game_state.set_turn_order(participant_ids)
-        db.update_game_state(game_state)
-        
-        # Update current participant after setting turn order
-        if game_state.current_turn is not None:
-            for p in participants:
-                if p.id == game_state.current_turn:
-                    current_participant = p.to_dict()
-                    break
     
-    return jsonify({
+    # Find current participant details
+    current_participant = _current_participant_dict(participants, game_state)
+    
+    response = jsonify({
         "current_turn": game_state.current_turn,
         "current_participant": current_participant,
         "game_phase": game_state.game_phase,
         "turn_order": game_state.turn_order,
         "total_participants": len(participants)
-    }), 200
+    })
+    response.set_etag(etag, weak=True)
+    return response, 200
 
 
-@app.route('/api/game/start', methods=['PUT'])
+@game_bp.route('/start', methods=['PUT'])
 def start_game():
     """
     Start the game and set the first player's turn.
@@ -355,42 +493,43 @@ def start_game():
         "game_phase": "active"
     }
     """
-    participants, gifts, game_state = db.read_all_data()
-    
-    # If no participants, can't start game
-    if not participants:
-        raise APIError(
-            'No participants registered',
-            status_code=400,
-            error_code='NO_PARTICIPANTS'
-        )
-    
-    # Can only start if in registration phase
-    if game_state.game_phase != "registration":
-        raise APIError(
-            'Game has already started',
-            status_code=400,
-            error_code='GAME_ALREADY_STARTED'
-        )
-    
-    # Set up turn order if not already set
-    if not game_state.turn_order:
-        participant_ids = sorted([p.id for p in participants])
-        game_state.set_turn_order(participant_ids)
-    
-    # Start the game (sets phase to active and current_turn to first participant)
-    game_state.start_game()
-    
-    # Find current participant details
-    current_participant = None
-    if game_state.current_turn is not None:
-        for p in participants:
-            if p.id == game_state.current_turn:
-                current_participant = p.to_dict()
-                break
+    def _start(participants, game_state):
+        # If no participants, can't start game
+        if not participants:
+            raise APIError(
+                'No participants registered',
+                status_code=400,
+                error_code='NO_PARTICIPANTS'
+            )
+        
+        # Can only start if in registration phase
+        if game_state.game_phase != "registration":
+            raise APIError(
+                'Game has already started',
+                status_code=400,
+                error_code='GAME_ALREADY_STARTED'
+            )
+        
+        # Set up turn order if not already set
+        if not game_state.turn_order:
+            participant_ids = sorted(map(attrgetter('id'), participants))
+            game_state.set_turn_order(participant_ids)
+        
+        # Start the game (sets phase to active and current_turn to first participant)
+        game_state.start_game()
+        
+        # Participants are stored in ID order, so with a freshly built turn order
+        # the first participant is the one holding the turn
+        if participants[0].id == game_state.current_turn:
+            current_participant = participants[0].to_dict()
+        else:
+            current_participant = _current_participant_dict(participants, game_state)
+        
+        return game_state, current_participant
     
-    # Update database
-    db.update_game_state(game_state)
+    # Read, modify and store the game state under one write lock so
+    # concurrent turn changes can't overwrite each other
+    game_state, current_participant = db.update_game_state_atomic(_start)
     
     return jsonify({
         "success": True,
@@ -401,7 +540,7 @@ def start_game():
     }), 200
 
 
-@app.route('/api/game/next-turn', methods=['PUT'])
+@game_bp.route('/next-turn', methods=['PUT'])
 def advance_turn():
     """
     Advance to the next turn.
@@ -418,37 +557,34 @@ def advance_turn():
         "game_phase": "registration|active|completed"
     }
     """
-    participants, gifts, game_state = db.read_all_data()
-    
-    # If no participants, can't advance turn
-    if not participants:
-        raise APIError(
-            'No participants registered',
-            status_code=400,
-            error_code='NO_PARTICIPANTS'
-        )
-    
-    # Game must be started (active phase) to advance turns
-    if game_state.game_phase == "registration":
-        raise APIError(
-            'Game has not started yet. Please start the game first.',
-            status_code=400,
-            error_code='GAME_NOT_STARTED'
-        )
-    
-    # Advance to next turn
-    next_turn_id = game_state.next_turn()
-    
-    # Find current participant details
-    current_participant = None
-    if game_state.current_turn is not None:
-        for p in participants:
-            if p.id == game_state.current_turn:
-                current_participant = p.to_dict()
-                break
+    def _advance(participants, game_state):
+        # If no participants, can't advance turn
+        if not participants:
+            raise APIError(
+                'No participants registered',
+                status_code=400,
+                error_code='NO_PARTICIPANTS'
+            )
+        
+        # Game must be started (active phase) to advance turns
+        if game_state.game_phase == "registration":
+            raise APIError(
+                'Game has not started yet. Please start the game first.',
+                status_code=400,
+                error_code='GAME_NOT_STARTED'
+            )
+        
+        # Advance to next turn
+        next_turn_id = game_state.next_turn()
+        
+        # Find current participant details
+        current_participant = _current_participant_dict(participants, game_state)
+        
+        return game_state, next_turn_id, current_participant
     
-    # Update database
-    db.update_game_state(game_state)
+    # Read, modify and store the game state under one write lock so
+    # concurrent turn changes can't overwrite each other
+    game_state, next_turn_id, current_participant = db.update_game_state_atomic(_advance)
     
     # Determine success message
     if game_state.game_phase == "completed":
@@ -467,65 +603,7 @@ def advance_turn():
     }), 200
 
 
-@app.route('/api/gifts/<gift_id>/reset-steals', methods=['PUT'])
-def reset_gift_steals(gift_id):
-    """
-    Reset a gift's steal count to 0 (admin override).
-    This also unlocks the gift.
-    
-    Returns:
-    {
-        "success": boolean,
-        "message": "description",
-        "gift": {
-            "id": "gift_id",
-            "name": "gift_name",
-            "steal_count": 0,
-            "is_locked": false,
-            "current_owner": owner_id_or_null,
-            "steal_history": [previous_owner_ids]
-        }
-    }
-    """
-    # Validate gift_id
-    if not gift_id or not isinstance(gift_id, str):
-        raise APIError(
-            'Invalid gift ID',
-            status_code=400,
-            error_code='INVALID_GIFT_ID'
-        )
-    
-    # Reset the gift's steal count
-    was_reset = db.reset_gift_steals_atomic(gift_id)
-    
-    # Get updated gift information
-    gifts = db.get_gifts()
-    updated_gift = None
-    for g in gifts:
-        if g.id == gift_id:
-            updated_gift = g
-            break
-    
-    if not updated_gift:
-        raise APIError(
-            'Gift not found',
-            status_code=404,
-            error_code='GIFT_NOT_FOUND'
-        )
-    
-    if was_reset:
-        message = "Gift steal count reset to 0 and unlocked - can be stolen again!"
-    else:
-        message = "Gift already has 0 steals and is unlocked"
-    
-    return jsonify({
-        "success": True,
-        "message": message,
-        "gift": updated_gift.to_dict()
-    }), 200
-
-
-@app.route('/api/game/previous-turn', methods=['PUT'])
+@game_bp.route('/previous-turn', methods=['PUT'])
 def go_back_turn():
     """
     Go back to the previous turn.
@@ -542,37 +620,34 @@ def go_back_turn():
         "game_phase": "registration|active|completed"
     }
     """
-    participants, gifts, game_state = db.read_all_data()
-    
-    # If no participants, can't go back
-    if not participants:
-        raise APIError(
-            'No participants registered',
-            status_code=400,
-            error_code='NO_PARTICIPANTS'
-        )
-    
-    # If turn order not set, can't go back
-    if not game_state.turn_order:
-        raise APIError(
-            'Game has not started yet',
-            status_code=400,
-            error_code='GAME_NOT_STARTED'
-        )
-    
-    # Go back to previous turn
-    previous_turn_id = game_state.previous_turn()
-    
-    # Find current participant details
-    current_participant = None
-    if game_state.current_turn is not None:
-        for p in participants:
-            if p.id == game_state.current_turn:
-                current_participant = p.to_dict()
-                break
+    def _go_back(participants, game_state):
+        # If no participants, can't go back
+        if not participants:
+            raise APIError(
+                'No participants registered',
+                status_code=400,
+                error_code='NO_PARTICIPANTS'
+            )
+        
+        # If turn order not set, can't go back
+        if not game_state.turn_order:
+            raise APIError(
+                'Game has not started yet',
+                status_code=400,
+                error_code='GAME_NOT_STARTED'
+            )
+        
+        # Go back to previous turn
+        previous_turn_id = game_state.previous_turn()
+        
+        # Find current participant details
+        current_participant = _current_participant_dict(participants, game_state)
+        
+        return game_state, previous_turn_id, current_participant
     
-    # Update database
-    db.update_game_state(game_state)
+    # Read, modify and store the game state under one write lock so
+    # concurrent turn changes can't overwrite each other
+    game_state, previous_turn_id, current_participant = db.update_game_state_atomic(_go_back)
     
     # Determine success message
     if previous_turn_id is None:
@@ -608,12 +683,13 @@ def nuclear_reset():
     }
     """
     # Get current counts before deletion
-    participants, gifts, game_state = db.read_all_data()
-    participant_count = len(participants)
-    gift_count = len(gifts)
+    snapshot = _get_snapshot()
+    participant_count = snapshot.participant_count
+    gift_count = snapshot.gift_count
     
     # Reset the database completely
     db.reset_database()
+    g.pop('snapshot', None)
     
     return jsonify({
         "success": True,
@@ -625,5 +701,11 @@ def nuclear_reset():
     }), 200
 
 
+app.register_blueprint(participants_bp)
+app.register_blueprint(gifts_bp)
+app.register_blueprint(game_bp)
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=8080)
\ No newline at end of file
+    # Handlers mostly wait on storage I/O, so serve each request on its own thread
+    app.run(debug=True, host='0.0.0.0', port=8080, threaded=True)
\ No newline at end of file
@@ -1,16 +1,63 @@
 """
 File-based database operations for the Secret Santa game.
 Handles JSON serialization and concurrent access safety.
+
+State is kept as a JSON snapshot plus an append-only write-ahead log (WAL)
+of per-entity records, so a mutation writes one line instead of the whole
+file; updates to existing entities log only the fields that changed. The log is folded back into the snapshot once it outgrows it.
 """
-import json
+import bisect
+import copy
 import os
+import random
 import fcntl
+import logging
+import threading
 import time
 import uuid
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Tuple
+from operator import itemgetter
+from typing import Any, Callable, Container, Dict, Iterable, List, Optional, Tuple, Union
 from contextlib import contextmanager
-from models import Participant, Gift, GameState
+import fast_json
+from models import Participant, Gift, GameState, Snapshot
+
+logger = logging.getLogger(__name__)
+
+# Compact once the WAL is this many times larger than the snapshot...
+COMPACTION_RATIO = 4
+# ...but never for logs smaller than this many bytes
+COMPACTION_MIN_BYTES = 64 * 1024
+
+# Participant numbers are drawn from 1..MAX_PARTICIPANTS
+MAX_PARTICIPANTS = 100
+# Bits 1..MAX_PARTICIPANTS set: every participant number still free
+_ALL_NUMBERS_MASK = (1 << (MAX_PARTICIPANTS + 1)) - 2
+
+# Flushes file data without the extra metadata write of fsync where available
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+# Makes each write to the WAL durable on return, saving the separate sync call
+_O_DSYNC = getattr(os, 'O_DSYNC', 0)
+
+
+def _open_dsync(path: str, flags: int) -> int:
+    """Opener for open() that adds O_DSYNC where the platform has it."""
+    return os.open(path, flags | _O_DSYNC, 0o666)
+
+
+def _fsync_dir(path: str) -> None:
+    """Make a rename in the directory holding path durable."""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sync_wal(wal) -> None:
+    """Flush WAL writes to disk, unless O_DSYNC already made them durable."""
+    if not _O_DSYNC:
+        _fdatasync(wal.fileno())
 
 
 class DatabaseError(Exception):
@@ -18,13 +65,260 @@ class DatabaseError(Exception):
     pass
 
 
+class ValidationError(DatabaseError):
+    """Exception raised when a value fails validation."""
+    pass
+
+
+class CapacityExceededError(DatabaseError):
+    """Exception raised when the participant limit is reached."""
+    pass
+
+
+class NotFoundError(DatabaseError):
+    """Exception raised when a referenced record does not exist."""
+    pass
+
+
 class ConcurrentAccessError(Exception):
     """Exception raised when concurrent access conflicts occur."""
     pass
 
 
+def _initial_data() -> Dict[str, Any]:
+    """Build the data structure of an empty database."""
+    return {
+        "participants": [],
+        "gifts": [],
+        "game_state": {
+            "current_turn": None,
+            "turn_order": [],
+            "game_phase": "registration"
+        },
+        "metadata": {
+            "last_updated": datetime.now().isoformat(),
+            "version": "1.0",
+            "generation": uuid.uuid4().hex
+        }
+    }
+
+
+def _update_record(op: str, old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Build the WAL record for an update to an existing entity.
+    
+    Only fields whose value changed are logged. The values are absolute
+    rather than increments, so the record stays safe to replay.
+    
+    Args:
+        op: Record type, "gift_update" or "game_state_update"
+        old: Entity as currently stored
+        new: Entity after the change
+    
+    Returns:
+        A list holding the record, or an empty list if nothing changed
+    """
+    fields = {key: value for key, value in new.items() if old.get(key) != value}
+    if not fields:
+        return []
+    if op == "gift_update":
+        return [{"op": op, "id": new["id"], "data": fields}]
+    return [{"op": op, "data": fields}]
+
+
+def _apply_records(state: '_DatabaseState', records: List[Dict[str, Any]], lines: List[bytes]) -> None:
+    """
+    Encode records as WAL lines and apply them to a working state.
+    
+    Args:
+        state: Unpublished state to update
+        records: Records returned by a change
+        lines: Encoded lines to append to the WAL; extended in place
+    """
+    for record in records:
+        line = fast_json.dumps(record) + b'\n'
+        # Apply the decoded line so memory matches what a replay produces
+        state.apply(fast_json.loads(line))
+        lines.append(line)
+
+
+def number_mask(ids: Iterable[int]) -> int:
+    """Build an integer with the bit of each given participant number set."""
+    mask = 0
+    for participant_id in ids:
+        mask |= 1 << participant_id
+    return mask
+
+
+def pick_free_number(used_ids: Iterable[int]) -> int:
+    """
+    Pick a random participant number that is not taken yet.
+    
+    Args:
+        used_ids: Numbers already assigned
+    
+    Returns:
+        A number from 1 to MAX_PARTICIPANTS, chosen uniformly among the free ones
+    
+    Raises:
+        DatabaseError: If every number is taken
+    """
+    return pick_free_number_from_mask(number_mask(used_ids))
+
+
+def new_gift_id(taken: Container[str]) -> str:
+    """
+    Generate a gift ID not in taken.
+    
+    IDs are 48 random bits as 12 hex digits: short to store and hash, and
+    drawn from the seeded PRNG rather than os.urandom, so no syscall.
+    
+    Args:
+        taken: IDs already in use
+    
+    Returns:
+        A new gift ID
+    """
+    while True:
+        gift_id = f'{random.getrandbits(48):012x}'
+        if gift_id not in taken:
+            return gift_id
+
+
+def pick_free_number_from_mask(used_mask: int) -> int:
+    """
+    Pick a random participant number whose bit is not set in used_mask.
+    
+    The k-th free bit is found by binary search on popcounts of the low
+    bits, so the cost is a handful of integer operations.
+    
+    Args:
+        used_mask: Taken numbers as built by number_mask
+    
+    Returns:
+        A number from 1 to MAX_PARTICIPANTS, chosen uniformly among the free ones
+    
+    Raises:
+        DatabaseError: If every number is taken
+    """
+    free = _ALL_NUMBERS_MASK & ~used_mask
+    if not free:
+        raise CapacityExceededError("No available participant numbers")
+    
+    # Find the lowest bit position whose prefix holds more than k free bits
+    k = random.randrange(free.bit_count())
+    low, high = 0, free.bit_length() - 1
+    while low < high:
+        middle = (low + high) // 2
+        if (free & ((2 << middle) - 1)).bit_count() > k:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+class _DatabaseState:
+    """
+    In-memory image of the snapshot with the WAL records replayed on top.
+    
+    Published instances are never modified in place; changes are applied to
+    a copy, so readers can use whichever state they picked up without locking.
+    Entity dicts are replaced wholesale and never mutated.
+    """
+    
+    def __init__(self, data: Dict[str, Any], snapshot_key: Optional[Tuple] = None):
+        """
+        Initialize the state from snapshot data.
+        
+        Args:
+            data: Decoded snapshot document
+            snapshot_key: Identity of the snapshot file the data was read from
+        """
+        self.participants = sorted(data.get("participants", []), key=itemgetter("id"))
+        # Taken participant numbers, kept up to date by apply()
+        self.used_mask = number_mask(p["id"] for p in self.participants)
+        self.gifts = {g["id"]: g for g in data.get("gifts", [])}
+        self.game_state = data.get("game_state", {})
+        # Ties the WAL to the snapshot it extends; None forces a checkpoint
+        self.generation = data.get("metadata", {}).get("generation")
+        self.snapshot_key = snapshot_key
+        self.wal_valid = False  # WAL header matches this generation
+        self.wal_offset = 0     # Bytes of the WAL applied to this state
+        self.wal_size = 0       # WAL size when it was last examined
+    
+    def copy(self) -> '_DatabaseState':
+        """Return a copy that can be modified without affecting this state."""
+        clone = copy.copy(self)
+        clone.participants = list(self.participants)
+        clone.gifts = dict(self.gifts)
+        return clone
+    
+    def apply(self, record: Dict[str, Any]) -> None:
+        """
+        Apply a WAL record. Records carry whole entities or the new values of
+        changed fields, so replaying one twice is harmless.
+        
+        Args:
+            record: Decoded record with "op" and "data" keys
+        """
+        op = record["op"]
+        data = record["data"]
+        if op == "participant":
+            # Keep participants ordered by ID
+            index = bisect.bisect_left(self.participants, data["id"], key=itemgetter("id"))
+            if index < len(self.participants) and self.participants[index]["id"] == data["id"]:
+                self.participants[index] = data
+            else:
+                self.participants.insert(index, data)
+                self.used_mask |= 1 << data["id"]
+        elif op == "gift":
+            self.gifts[data["id"]] = data
+        elif op == "gift_update":
+            gift = self.gifts.get(record["id"])
+            if gift is None:
+                raise DatabaseError(f"WAL update for unknown gift {record['id']}")
+            self.gifts[record["id"]] = {**gift, **data}
+        elif op == "game_state":
+            self.game_state = data
+        elif op == "game_state_update":
+            self.game_state = {**self.game_state, **data}
+        else:
+            raise DatabaseError(f"Unknown WAL record type: {op}")
+    
+    def to_data(self, generation: str) -> Dict[str, Any]:
+        """Build the snapshot document for this state."""
+        return {
+            "participants": self.participants,
+            "gifts": list(self.gifts.values()),
+            "game_state": self.game_state,
+            "metadata": {
+                "last_updated": datetime.now().isoformat(),
+                "version": "1.0",
+                "generation": generation
+            }
+        }
+
+
+class _WriteRequest:
+    """A change waiting to be committed by FileDatabase._mutate, and its outcome."""
+    
+    __slots__ = ('change', 'recover_corrupt', 'done', 'result', 'error')
+    
+    def __init__(self, change: Callable, recover_corrupt: bool):
+        self.change = change
+        self.recover_corrupt = recover_corrupt
+        self.done = False
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
 class FileDatabase:
-    """File-based database with JSON serialization and file locking."""
+    """File-based database with a JSON snapshot, a write-ahead log and file locking."""
+    
+    # Lock-free reads that race a checkpoint before falling back to the lock
+    LOCK_FREE_READ_ATTEMPTS = 3
+    # Upper bound in seconds on the measured retry backoff slot
+    MAX_RETRY_SLOT = 1.0
     
     def __init__(self, data_file: str = 'game_data.json', max_retries: int = 5, retry_delay: float = 0.1):
         """
@@ -38,40 +332,72 @@ class FileDatabase:
         self.data_file = data_file
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        # Last state read from or written to disk by this instance
+        self._state: Optional[_DatabaseState] = None
+        # ((st_dev, st_ino), handle) of the WAL kept open for lock-free reads
+        self._wal_reader: Optional[Tuple[Tuple[int, int], Any]] = None
+        # Changes queued by threads of this process for the next group commit
+        self._pending: List[_WriteRequest] = []
+        self._pending_lock = threading.Lock()
+        # Held by the thread committing a batch; the others queue behind it
+        self._writer_lock = threading.Lock()
+        # Per-thread (working state, encoded records) while batch() is active
+        self._local = threading.local()
         self._ensure_data_file_exists()
     
+    @property
+    def wal_file(self) -> str:
+        """Path of the write-ahead log next to the data file."""
+        return f"{self.data_file}.wal"
+    
     def _ensure_data_file_exists(self) -> None:
         """Create the data file with initial structure if it doesn't exist."""
         if not os.path.exists(self.data_file) or os.path.getsize(self.data_file) == 0:
-            initial_data = {
-                "participants": [],
-                "gifts": [],
-                "game_state": {
-                    "current_turn": None,
-                    "turn_order": [],
-                    "game_phase": "registration"
-                },
-                "metadata": {
-                    "last_updated": datetime.now().isoformat(),
-                    "version": "1.0"
-                }
-            }
             # Write directly without using the file lock context manager to avoid recursion
-            with open(self.data_file, 'w') as f:
-                json.dump(initial_data, f, indent=2)
+            self._atomic_write_json(_initial_data())
+    
+    def _atomic_write_json(self, data: Dict[str, Any]) -> None:
+        """
+        Replace the data file with compact JSON via a temp file and a rename,
+        so readers see either the old or the new file and never a torn one.
+        
+        Args:
+            data: Snapshot document to write
+        """
+        temp_file = f"{self.data_file}.tmp.{os.getpid()}"
+        try:
+            with open(temp_file, 'wb') as f:
+                f.write(fast_json.dumps(data))
+                f.flush()
+                _fdatasync(f.fileno())
+            os.replace(temp_file, self.data_file)
+        except BaseException:
+            if os.path.exists(temp_file):
+                os.unlink(temp_file)
+            raise
+        # The WAL is reset for the new snapshot right after this, so the
+        # rename has to reach the disk first or a crash could pair the old
+        # snapshot with a log it no longer matches
+        _fsync_dir(self.data_file)
     
     @contextmanager
-    def _file_lock(self, mode: str = 'r', lock_type: int = fcntl.LOCK_SH):
+    def _file_lock(self, lock_type: int = fcntl.LOCK_SH):
         """
         Context manager for file locking.
         
+        The lock is taken on the WAL, which unlike the snapshot is never
+        replaced, so every process locks the same inode.
+        
         Args:
-            mode: File open mode ('r' for read, 'w' for write)
             lock_type: Type of lock (LOCK_SH for shared, LOCK_EX for exclusive)
+        
+        Yields:
+            The WAL opened unbuffered for reading and appending, so each
+            write is a single O_APPEND write() call, and with O_DSYNC
         """
         file_handle = None
         try:
-            file_handle = open(self.data_file, mode)
+            file_handle = open(self.wal_file, 'a+b', buffering=0, opener=_open_dsync)
             fcntl.flock(file_handle.fileno(), lock_type)
             yield file_handle
         finally:
@@ -79,20 +405,355 @@ class FileDatabase:
                 fcntl.flock(file_handle.fileno(), fcntl.LOCK_UN)
                 file_handle.close()
     
-    def _read_data_from_file(self) -> Dict[str, Any]:
-        """Read data from file with shared lock."""
-        with self._file_lock('r', fcntl.LOCK_SH) as f:
-            return json.load(f)
+    def _snapshot_key(self) -> Tuple:
+        """Identify the current snapshot file without reading it."""
+        st = os.stat(self.data_file)
+        return (self.data_file, st.st_ino, st.st_mtime_ns, st.st_size)
+    
+    def _wal_size(self) -> int:
+        """Get the size of the WAL, treating a missing log as empty."""
+        try:
+            return os.stat(self.wal_file).st_size
+        except FileNotFoundError:
+            return 0
+    
+    def _sync(self, wal, recover_corrupt: bool = False) -> _DatabaseState:
+        """
+        Bring the in-memory state up to date with the files on disk.
+        
+        The snapshot is only re-read when it was replaced; otherwise just the
+        WAL records appended since the last sync are replayed. The result is
+        not published to self._state. Without the file lock held, it is only
+        valid if the snapshot was not replaced while it was being read.
+        
+        Args:
+            wal: WAL file handle opened for reading
+            recover_corrupt: Start from an empty database if the snapshot is corrupt
+        
+        Returns:
+            Current state
+        """
+        snapshot_key = self._snapshot_key()
+        wal_size = os.fstat(wal.fileno()).st_size
+        state = self._state
+        
+        if state is None or state.snapshot_key != snapshot_key or wal_size < state.wal_offset:
+            with open(self.data_file, 'rb') as f:
+                raw = f.read()
+            try:
+                state = _DatabaseState(fast_json.loads(raw), snapshot_key)
+            except fast_json.JSONDecodeError:
+                if not recover_corrupt:
+                    raise
+                # Without a generation the next write rewrites the snapshot
+                data = _initial_data()
+                del data["metadata"]["generation"]
+                return _DatabaseState(data)
+        elif wal_size != state.wal_size:
+            state = state.copy()
+        else:
+            return state
+        
+        if wal_size > state.wal_offset:
+            # pread leaves the file position alone, so handles can be shared
+            chunk = os.pread(wal.fileno(), wal_size - state.wal_offset, state.wal_offset)
+            # A trailing partial line is a torn write; leave it unapplied
+            end = chunk.rfind(b'\n') + 1
+            lines = chunk[:end].splitlines(keepends=True)
+            applied = 0
+            if not state.wal_valid and lines:
+                try:
+                    header = fast_json.loads(lines[0])
+                except fast_json.JSONDecodeError:
+                    header = {}
+                # A log left over from an older snapshot is ignored and
+                # truncated by the next write
+                state.wal_valid = state.generation is not None and header.get("generation") == state.generation
+                applied = len(lines[0])
+                lines = lines[1:]
+            if state.wal_valid:
+                for line in lines:
+                    try:
+                        state.apply(fast_json.loads(line))
+                    except (ValueError, KeyError, TypeError, DatabaseError) as e:
+                        # Treat a record that can't be replayed like a torn
+                        # write: stop before it so the next write truncates it
+                        logger.warning(f"Ignoring unreadable WAL record at offset "
+                                       f"{state.wal_offset + applied} and after: {e}")
+                        break
+                    applied += len(line)
+                state.wal_offset += applied
+        
+        state.wal_size = wal_size
+        return state
+    
+    def _get_wal_reader(self, wal_stat: os.stat_result):
+        """
+        Get the read-only WAL handle used for lock-free reads.
+        
+        The WAL is never replaced in normal operation, so one handle is kept
+        open and shared across reads and threads instead of opening the log
+        for every read. It is reopened if the path now names another file.
+        
+        Args:
+            wal_stat: Result of stat() on the WAL path
+        
+        Returns:
+            WAL file handle opened for reading
+        """
+        reader = self._wal_reader
+        if reader is None or reader[0] != (wal_stat.st_dev, wal_stat.st_ino):
+            # The old handle is left to be closed once no reader still uses it
+            handle = open(self.wal_file, 'rb', buffering=0)
+            st = os.fstat(handle.fileno())
+            reader = self._wal_reader = ((st.st_dev, st.st_ino), handle)
+        return reader[1]
+    
+    def _load_state(self) -> _DatabaseState:
+        """
+        Get the current state, touching the disk only to stat the files
+        when nothing has changed since the last read.
+        
+        Returns:
+            Current state
+        """
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            # Inside batch(): read this thread's uncommitted changes; the copy
+            # keeps the result fixed while the batch goes on
+            return batch[0].copy()
+        
+        state = self._state
+        try:
+            wal_stat = os.stat(self.wal_file)
+        except FileNotFoundError:
+            wal_stat = None
+        if (state is not None and state.snapshot_key == self._snapshot_key()
+                and state.wal_size == (wal_stat.st_size if wal_stat else 0)):
+            return state
+        
+        # Read without the lock so readers never wait for a writer's fdatasync.
+        # Writers replace the snapshot before they truncate the WAL, so if the
+        # snapshot is unchanged afterwards, the WAL bytes read belong to it.
+        if wal_stat is not None:
+            wal = self._get_wal_reader(wal_stat)
+            for _ in range(self.LOCK_FREE_READ_ATTEMPTS):
+                state = self._sync(wal)
+                if state.snapshot_key == self._snapshot_key():
+                    self._state = state
+                    return state
+        
+        with self._file_lock(fcntl.LOCK_SH) as wal:
+            state = self._sync(wal)
+            self._state = state
+            return state
+    
+    def _checkpoint_locked(self, wal, state: _DatabaseState) -> None:
+        """
+        Write the state as a new snapshot and start an empty WAL for it.
+        
+        The snapshot is replaced atomically; if the process dies before the WAL
+        is reset, the old log no longer matches the generation and is ignored.
+        Must be called with the exclusive file lock held.
+        
+        Args:
+            wal: WAL file handle from _file_lock
+            state: State to persist; updated to describe the new files
+        """
+        generation = uuid.uuid4().hex
+        self._atomic_write_json(state.to_data(generation))
+        
+        header = fast_json.dumps({"generation": generation}) + b'\n'
+        wal.truncate(0)
+        wal.write(header)
+        _sync_wal(wal)
+        
+        state.generation = generation
+        state.snapshot_key = self._snapshot_key()
+        state.wal_valid = True
+        state.wal_offset = state.wal_size = len(header)
+        self._state = state
+    
+    def _append_locked(self, wal, state: _DatabaseState, lines: List[bytes]) -> None:
+        """
+        Durably append records to the WAL and publish the resulting state.
+        Must be called with the exclusive file lock held.
+        
+        Args:
+            wal: WAL file handle from _file_lock
+            state: Unpublished copy of the synced state with the records applied
+            lines: Encoded records to append, one per line
+        """
+        if state.generation is None:
+            self._checkpoint_locked(wal, state)
+            return
+        
+        if not state.wal_valid:
+            # Start a fresh log; the header goes out in the same write
+            lines.insert(0, fast_json.dumps({"generation": state.generation}) + b'\n')
+            wal.truncate(0)
+            state.wal_offset = 0
+        elif state.wal_size > state.wal_offset:
+            # Drop a torn record so the next line starts cleanly
+            wal.truncate(state.wal_offset)
+        
+        payload = b''.join(lines)
+        try:
+            if wal.write(payload) != len(payload):
+                raise OSError(f"Short write to {self.wal_file}")
+            _sync_wal(wal)  # Force write to disk
+        except OSError:
+            # Complete lines left in the log would be replayed while the
+            # caller retries the change, applying it twice, so drop them
+            try:
+                wal.truncate(state.wal_offset)
+                _fdatasync(wal.fileno())
+            except OSError as e:
+                raise DatabaseError(f"Failed to roll back a partial write to {self.wal_file}: {e}") from e
+            raise
+        state.wal_valid = True
+        state.wal_offset += len(payload)
+        state.wal_size = state.wal_offset
+        self._state = state
+        
+        if state.wal_offset > max(COMPACTION_RATIO * state.snapshot_key[3], COMPACTION_MIN_BYTES):
+            # The records are already durable, so a failed compaction must not
+            # fail the write; the files stay consistent and the next append retries it
+            try:
+                self._checkpoint_locked(wal, state.copy())
+            except OSError as e:
+                logger.warning(f"WAL compaction failed, keeping the log: {e}")
+    
+    def _mutate(self, change, recover_corrupt: bool = False):
+        """
+        Run a change against the current state under the exclusive lock.
+        
+        Changes from concurrent threads are group committed: whichever thread
+        gets the writer lock takes every queued change, runs them in order
+        under one file lock and appends all their records with one write.
+        
+        Args:
+            change: Function taking the state and returning (records, result);
+                records may be empty when nothing changed
+            recover_corrupt: Start from an empty database if the snapshot is corrupt
+        
+        Returns:
+            The result returned by change
+        """
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            # Inside batch(): this thread already holds the locks
+            working, lines = batch
+            records, result = change(working)
+            _apply_records(working, records, lines)
+            return result
+        
+        request = _WriteRequest(change, recover_corrupt)
+        with self._pending_lock:
+            self._pending.append(request)
+        
+        with self._writer_lock:
+            if not request.done:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                self._commit_batch(batch)
+        
+        if request.error is not None:
+            raise request.error
+        return request.result
+    
+    def _commit_batch(self, batch: List[_WriteRequest]) -> None:
+        """
+        Run queued changes in order and durably append their records together.
+        
+        Each change sees the effects of the ones before it. A change that
+        raises fails only its own request; a failed write fails every request
+        whose change succeeded, so their callers retry.
+        
+        Args:
+            batch: Requests to commit; all are marked done on return
+        """
+        try:
+            with self._file_lock(fcntl.LOCK_EX) as wal:
+                try:
+                    state = self._sync(wal)
+                except fast_json.JSONDecodeError as e:
+                    if not any(request.recover_corrupt for request in batch):
+                        raise
+                    for request in batch:
+                        if not request.recover_corrupt:
+                            request.error = e
+                            request.done = True
+                    state = self._sync(wal, recover_corrupt=True)
+                self._state = state
+                
+                working = state.copy()
+                lines = []
+                for request in batch:
+                    if request.done:
+                        continue
+                    try:
+                        records, request.result = request.change(working)
+                    except Exception as e:
+                        request.error = e
+                        request.done = True
+                        continue
+                    _apply_records(working, records, lines)
+                
+                if lines:
+                    self._append_locked(wal, working, lines)
+        except BaseException as e:
+            for request in batch:
+                if not request.done:
+                    request.error = e
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            for request in batch:
+                request.done = True
+    
+    @contextmanager
+    def batch(self):
+        """
+        Commit the calling thread's changes made in the block with one WAL append.
+        
+        The exclusive lock is held for the whole block, so other writers wait
+        until it exits. Reads from the same thread see the batched changes;
+        other readers see them once the block has committed. If the block
+        raises, none of its changes are written.
+        
+        Yields:
+            This database
+        """
+        if getattr(self._local, 'batch', None) is not None:
+            # A nested batch joins the outer one
+            yield self
+            return
+        
+        with self._writer_lock, self._file_lock(fcntl.LOCK_EX) as wal:
+            state = self._sync(wal)
+            self._state = state
+            working, lines = state.copy(), []
+            self._local.batch = (working, lines)
+            try:
+                yield self
+            finally:
+                self._local.batch = None
+            if lines:
+                self._append_locked(wal, working, lines)
     
     def _write_data_to_file(self, data: Dict[str, Any]) -> None:
-        """Write data to file with exclusive lock."""
-        data['metadata']['last_updated'] = datetime.now().isoformat()
-        with self._file_lock('w', fcntl.LOCK_EX) as f:
-            json.dump(data, f, indent=2)
+        """Replace the whole database with data under an exclusive lock."""
+        if getattr(self._local, 'batch', None) is not None:
+            # The file lock is already held by batch(); taking it again would deadlock
+            raise DatabaseError("The database can't be replaced inside batch()")
+        with self._file_lock(fcntl.LOCK_EX) as wal:
+            self._checkpoint_locked(wal, _DatabaseState(data))
     
     def _retry_operation(self, operation, *args, **kwargs):
         """
-        Retry an operation with exponential backoff.
+        Retry an operation, yielding before the first retry and backing off
+        with jittered slots after that.
         
         Args:
             operation: Function to retry
@@ -106,41 +767,67 @@ class FileDatabase:
             ConcurrentAccessError: If all retries fail
         """
         last_exception = None
+        start = time.monotonic()
+        slot = None
         
         for attempt in range(self.max_retries):
             try:
                 return operation(*args, **kwargs)
-            except (OSError, IOError, json.JSONDecodeError) as e:
+            except (OSError, IOError, fast_json.JSONDecodeError) as e:
                 last_exception = e
-                if attempt < self.max_retries - 1:
-                    # Exponential backoff
-                    delay = self.retry_delay * (2 ** attempt)
-                    time.sleep(delay)
+                if slot is None:
+                    # Size the backoff slot by how long a failed attempt takes,
+                    # capped so one slow failure can't stretch every wait
+                    slot = max(min(time.monotonic() - start, self.MAX_RETRY_SLOT), self.retry_delay)
+                if attempt == 0:
+                    # Writers hold the file lock only briefly and a lock-free read
+                    # that raced a checkpoint succeeds at once on a second try,
+                    # so the first retry only yields the CPU
+                    os.sched_yield()
+                elif attempt < self.max_retries - 1:
+                    # Jittered slot backoff: a random wait of up to attempt
+                    # slots keeps colliding callers from waking in lockstep
+                    time.sleep(random.uniform(0, attempt) * slot)
                 continue
         
         raise ConcurrentAccessError(f"Operation failed after {self.max_retries} attempts: {last_exception}")
     
-    def read_all_data(self) -> Tuple[List[Participant], List[Gift], GameState]:
+    def get_version(self) -> str:
+        """
+        Get a cheap token identifying the current state of the data files.
+        
+        The token changes whenever the snapshot is replaced or the WAL grows,
+        so it can be used as an HTTP entity tag without reading either file.
+        
+        Returns:
+            Opaque version string
+        """
+        try:
+            st = os.stat(self.data_file)
+            wal_size = self._wal_size()
+        except OSError:
+            # Never match a previous version; the read path reports the error
+            return uuid.uuid4().hex
+        return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}-{wal_size:x}"
+    
+    def read_all_data(self) -> Snapshot:
         """
         Read all data from the database.
         
         Returns:
-            Tuple of (participants, gifts, game_state)
+            Snapshot of (participants, gifts, game_state)
         """
         def _read():
-            data = self._read_data_from_file()
-            
-            participants = [Participant.from_dict(p) for p in data.get("participants", [])]
-            gifts = [Gift.from_dict(g) for g in data.get("gifts", [])]
-            game_state = GameState.from_dict(data.get("game_state", {}))
-            
-            return participants, gifts, game_state
+            state = self._load_state()
+            # Published states are never modified, so the snapshot can
+            # reference their containers directly
+            return Snapshot(state.participants, state.gifts.values(), state.game_state)
         
         return self._retry_operation(_read)
     
     def write_all_data(self, participants: List[Participant], gifts: List[Gift], game_state: GameState) -> None:
         """
-        Write all data to the database.
+        Write all data to the database as a new snapshot.
         
         Args:
             participants: List of participants
@@ -151,11 +838,7 @@ class FileDatabase:
             data = {
                 "participants": [p.to_dict() for p in participants],
                 "gifts": [g.to_dict() for g in gifts],
-                "game_state": game_state.to_dict(),
-                "metadata": {
-                    "last_updated": datetime.now().isoformat(),
-                    "version": "1.0"
-                }
+                "game_state": game_state.to_dict()
             }
             self._write_data_to_file(data)
         
@@ -174,85 +857,36 @@ class FileDatabase:
         Raises:
             DatabaseError: If participant limit reached or name is invalid
         """
-        def _add_participant():
-            # Use exclusive lock for the entire operation to ensure atomicity
-            with self._file_lock('r+', fcntl.LOCK_EX) as f:
-                # Read current data
-                f.seek(0)
-                try:
-                    data = json.load(f)
-                except json.JSONDecodeError:
-                    # File is corrupted, reinitialize
-                    data = {
-                        "participants": [],
-                        "gifts": [],
-                        "game_state": {
-                            "current_turn": None,
-                            "turn_order": [],
-                            "game_phase": "registration"
-                        },
-                        "metadata": {
-                            "last_updated": datetime.now().isoformat(),
-                            "version": "1.0"
-                        }
-                    }
-                
-                participants = [Participant.from_dict(p) for p in data.get("participants", [])]
-                gifts = [Gift.from_dict(g) for g in data.get("gifts", [])]
-                game_state = GameState.from_dict(data.get("game_state", {}))
-                
-                # Validate name
-                if not name or not name.strip():
-                    raise DatabaseError("Participant name cannot be empty")
-                
-                # Check participant limit
-                if len(participants) >= 100:
-                    raise DatabaseError("Maximum number of participants (100) reached")
-                
-                # Generate random available number
-                import random
-                used_numbers = {p.id for p in participants}
-                available_numbers = [i for i in range(1, 101) if i not in used_numbers]
-                
-                if not available_numbers:
-                    raise DatabaseError("No available participant numbers")
-                
-                next_number = random.choice(available_numbers)
-                
-                # Create new participant
-                new_participant = Participant(next_number, name.strip())
-                participants.append(new_participant)
-                
-                # Write back to file atomically
-                new_data = {
-                    "participants": [p.to_dict() for p in participants],
-                    "gifts": [g.to_dict() for g in gifts],
-                    "game_state": game_state.to_dict(),
-                    "metadata": {
-                        "last_updated": datetime.now().isoformat(),
-                        "version": "1.0"
-                    }
-                }
-                
-                f.seek(0)
-                f.truncate()
-                json.dump(new_data, f, indent=2)
-                f.flush()
-                os.fsync(f.fileno())  # Force write to disk
-                
-                return new_participant
+        def _add_participant(state):
+            # Validate name
+            if not name or not name.strip():
+                raise ValidationError("Participant name cannot be empty")
+            
+            # Check participant limit
+            if len(state.participants) >= MAX_PARTICIPANTS:
+                raise CapacityExceededError(f"Maximum number of participants ({MAX_PARTICIPANTS}) reached")
+            
+            # Generate random available number
+            next_number = pick_free_number_from_mask(state.used_mask)
+            
+            # Create new participant
+            new_participant = Participant(next_number, name.strip())
+            
+            return [{"op": "participant", "data": new_participant.to_dict()}], new_participant
         
-        return self._retry_operation(_add_participant)
+        # A corrupted file is reinitialized rather than failing registration
+        return self._retry_operation(self._mutate, _add_participant, recover_corrupt=True)
     
     def get_participants(self) -> List[Participant]:
         """Get all participants."""
-        participants, _, _ = self.read_all_data()
-        return participants
+        return self.read_all_data().participants
     
     def get_participant_count(self) -> int:
         """Get the current number of participants."""
-        participants = self.get_participants()
-        return len(participants)
+        def _count():
+            return len(self._load_state().participants)
+        
+        return self._retry_operation(_count)
     
     def add_gift(self, name: str, owner_id: Optional[int] = None) -> Gift:
         """
@@ -265,106 +899,104 @@ class FileDatabase:
         Returns:
             Created gift
         """
-        def _add_gift():
-            participants, gifts, game_state = self.read_all_data()
-            
+        def _add_gift(state):
             # Validate gift name
             if not name or not name.strip():
-                raise DatabaseError("Gift name cannot be empty")
+                raise ValidationError("Gift name cannot be empty")
             
             # Generate unique gift ID
-            gift_id = str(uuid.uuid4())
+            gift_id = new_gift_id(state.gifts)
             
             # Create new gift
             new_gift = Gift(gift_id, name.strip(), owner_id)
-            gifts.append(new_gift)
             
-            # Write back to file
-            self.write_all_data(participants, gifts, game_state)
-            
-            return new_gift
+            return [{"op": "gift", "data": new_gift.to_dict()}], new_gift
         
-        return self._retry_operation(_add_gift)
+        return self._retry_operation(self._mutate, _add_gift)
     
-    def steal_gift_atomic(self, gift_id: str, new_owner_id: int) -> bool:
+    def steal_gift_atomic(self, gift_id: str, new_owner_id: int,
+                          return_gift: bool = False) -> Union[bool, Tuple[bool, Gift]]:
         """
         Atomically steal a gift.
         
         Args:
             gift_id: ID of gift to steal
             new_owner_id: ID of participant stealing the gift
+            return_gift: Also return the gift as it stands after the operation
             
         Returns:
-            True if steal was successful, False if gift is locked
+            True if steal was successful, False if gift is locked.
+            With return_gift, a (success, gift) tuple.
             
         Raises:
             DatabaseError: If gift not found
         """
-        def _steal_gift():
-            participants, gifts, game_state = self.read_all_data()
-            
+        # Only an admin reset unlocks a gift, so when the latest committed
+        # state has it locked the steal can be refused without the write lock
+        gift_data = self._retry_operation(self._load_state).gifts.get(gift_id)
+        if gift_data is not None and gift_data.get("is_locked", False):
+            if return_gift:
+                return False, Gift.from_dict(gift_data)
+            return False
+        
+        def _steal_gift(state):
             # Find the gift
-            gift = None
-            for g in gifts:
-                if g.id == gift_id:
-                    gift = g
-                    break
+            gift_data = state.gifts.get(gift_id)
             
-            if gift is None:
-                raise DatabaseError(f"Gift with ID {gift_id} not found")
+            if gift_data is None:
+                raise NotFoundError(f"Gift with ID {gift_id} not found")
             
             # Attempt to steal
+            gift = Gift.from_dict(gift_data)
             success = gift.steal_gift(new_owner_id)
             
-            if success:
-                # Write back to file
-                self.write_all_data(participants, gifts, game_state)
+            records = _update_record("gift_update", gift_data, gift.to_dict()) if success else []
             
-            return success
+            if return_gift:
+                return records, (success, gift)
+            return records, success
         
-        return self._retry_operation(_steal_gift)
+        return self._retry_operation(self._mutate, _steal_gift)
     
     def get_gifts(self) -> List[Gift]:
         """Get all gifts."""
-        _, gifts, _ = self.read_all_data()
-        return gifts
+        return self.read_all_data().gifts
     
-    def reset_gift_steals_atomic(self, gift_id: str) -> bool:
+    def reset_gift_steals_atomic(self, gift_id: str,
+                                 return_gift: bool = False) -> Union[bool, Tuple[bool, Gift]]:
         """
         Atomically reset a gift's steal count to 0 (admin override).
         This also unlocks the gift.
         
         Args:
             gift_id: ID of the gift to reset
+            return_gift: Also return the gift as it stands after the operation
             
         Returns:
-            True if gift was reset, False if gift not found
+            True if gift was reset, False if it already had 0 steals.
+            With return_gift, a (was_reset, gift) tuple.
             
         Raises:
             DatabaseError: If gift not found
         """
-        def _reset_gift():
-            participants, gifts, game_state = self.read_all_data()
-            
+        def _reset_gift(state):
             # Find the gift
-            target_gift = None
-            for gift in gifts:
-                if gift.id == gift_id:
-                    target_gift = gift
-                    break
+            gift_data = state.gifts.get(gift_id)
             
-            if not target_gift:
-                raise DatabaseError(f"Gift with ID '{gift_id}' not found")
+            if gift_data is None:
+                raise NotFoundError(f"Gift with ID '{gift_id}' not found")
             
             # Reset steal count and unlock
+            target_gift = Gift.from_dict(gift_data)
             was_reset = target_gift.reset_steal_count()
             
-            # Write back to database
-            self.write_all_data(participants, gifts, game_state)
+            records = _update_record("gift_update", gift_data, target_gift.to_dict()) if was_reset else []
             
-            return was_reset
+            if return_gift:
+                return records, (was_reset, target_gift)
+            return records, was_reset
         
-        return self._retry_operation(_reset_gift)
+        return self._retry_operation(self._mutate, _reset_gift)
     
     def update_gift_name_atomic(self, gift_id: str, new_name: str) -> Gift:
         """
@@ -380,37 +1012,35 @@ class FileDatabase:
         Raises:
             DatabaseError: If gift not found or name is invalid
         """
-        def _update_gift_name():
-            participants, gifts, game_state = self.read_all_data()
-            
-            # Validate gift name
-            if not new_name or not new_name.strip():
-                raise DatabaseError("Gift name cannot be empty")
-            
+        # Validate gift name
+        if not new_name or not new_name.strip():
+            raise ValidationError("Gift name cannot be empty")
+        
+        # Renaming a gift to its current name changes nothing to write
+        gift_data = self._retry_operation(self._load_state).gifts.get(gift_id)
+        if gift_data is not None and gift_data["name"] == new_name.strip():
+            return Gift.from_dict(gift_data)
+        
+        def _update_gift_name(state):
             # Find the gift
-            target_gift = None
-            for gift in gifts:
-                if gift.id == gift_id:
-                    target_gift = gift
-                    break
-            
-            if not target_gift:
-                raise DatabaseError(f"Gift with ID '{gift_id}' not found")
+            gift_data = state.gifts.get(gift_id)
             
-            # Update the gift name (preserves all other properties)
-            target_gift.name = new_name.strip()
+            if gift_data is None:
+                raise NotFoundError(f"Gift with ID '{gift_id}' not found")
             
-            # Write back to database
-            self.write_all_data(participants, gifts, game_state)
-            
-            return target_gift
+            # Only the name changes, so log just that field instead of
+            # rebuilding the gift and diffing every field
+            name = new_name.strip()
+            if gift_data["name"] == name:
+                return [], Gift.from_dict(gift_data)
+            records = [{"op": "gift_update", "id": gift_id, "data": {"name": name}}]
+            return records, Gift.from_dict({**gift_data, "name": name})
         
-        return self._retry_operation(_update_gift_name)
+        return self._retry_operation(self._mutate, _update_gift_name)
     
     def get_game_state(self) -> GameState:
         """Get current game state."""
-        _, _, game_state = self.read_all_data()
-        return game_state
+        return self.read_all_data().game_state
     
     def update_game_state(self, game_state: GameState) -> None:
         """
@@ -419,28 +1049,40 @@ class FileDatabase:
         Args:
             game_state: New game state
         """
-        def _update_game_state():
-            participants, gifts, _ = self.read_all_data()
-            self.write_all_data(participants, gifts, game_state)
+        def _update_game_state(state):
+            return _update_record("game_state_update", state.game_state, game_state.to_dict()), None
         
-        return self._retry_operation(_update_game_state)
+        return self._retry_operation(self._mutate, _update_game_state)
+    
+    def update_game_state_atomic(self, change: Callable[[List[Participant], GameState], Any]) -> Any:
+        """
+        Atomically read, modify and store the game state.
+        
+        Unlike read_all_data() followed by update_game_state(), no other
+        writer can change the data in between, so concurrent turn changes
+        can't overwrite each other.
+        
+        Args:
+            change: Function taking (participants, game_state) that modifies
+                game_state in place and returns a result; raising aborts
+                without writing
+        
+        Returns:
+            The result returned by change
+        """
+        def _update_game_state(state):
+            participants = [Participant.from_dict(p) for p in state.participants]
+            game_state = GameState.from_dict(state.game_state)
+            
+            result = change(participants, game_state)
+            
+            return _update_record("game_state_update", state.game_state, game_state.to_dict()), result
+        
+        return self._retry_operation(self._mutate, _update_game_state)
     
     def reset_database(self) -> None:
         """
         Nuclear reset - Delete all data and reset to initial state.
         This is a destructive operation that cannot be undone.
         """
-        initial_data = {
-            "participants": [],
-            "gifts": [],
-            "game_state": {
-                "current_turn": None,
-                "turn_order": [],
-                "game_phase": "registration"
-            },
-            "metadata": {
-                "last_updated": datetime.now().isoformat(),
-                "version": "1.0"
-            }
-        }
-        self._write_data_to_file(initial_data)
+        self._write_data_to_file(_initial_data())
@@ -2,17 +2,140 @@
 Comprehensive error handling for the Secret Santa backend application.
 """
 
-from flask import jsonify, request
+from flask import jsonify, request, g
 from werkzeug.exceptions import HTTPException
 import logging
+import queue
+import sys
+import threading
+import time
 import traceback
+from functools import lru_cache
 from datetime import datetime
-from database import DatabaseError, ConcurrentAccessError
+import fast_json
+from database import (
+    DatabaseError, ValidationError, CapacityExceededError, NotFoundError, ConcurrentAccessError
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Tracebacks waiting to be formatted and logged by the worker thread
+_traceback_queue = queue.Queue(maxsize=1000)
+_traceback_thread = None
+_traceback_thread_lock = threading.Lock()
+
+
+def _traceback_worker() -> None:
+    """Format and log queued tracebacks, off the request threads."""
+    while True:
+        exc_info = _traceback_queue.get()
+        try:
+            logger.error(''.join(traceback.format_exception(*exc_info)))
+        finally:
+            _traceback_queue.task_done()
+
+
+def log_traceback() -> None:
+    """
+    Log the traceback of the exception being handled.
+    
+    Walking and formatting the stack is left to a background thread so the
+    error response isn't held up by it. The thread is started on first use,
+    so each worker process of a forking server gets its own.
+    """
+    global _traceback_thread
+    
+    if _traceback_thread is None or not _traceback_thread.is_alive():
+        with _traceback_thread_lock:
+            if _traceback_thread is None or not _traceback_thread.is_alive():
+                _traceback_thread = threading.Thread(target=_traceback_worker, daemon=True,
+                                                     name='traceback-logger')
+                _traceback_thread.start()
+    
+    try:
+        _traceback_queue.put_nowait(sys.exc_info())
+    except queue.Full:
+        logger.error("Traceback dropped: logging queue is full")
+
+# (epoch second, ISO string) of the last formatted timestamp
+_timestamp_cache = (0, '')
+
+
+def now_iso() -> str:
+    """
+    Get the current local time as an ISO 8601 string with second precision.
+    
+    The string is formatted at most once a second, so error floods and
+    health probes don't each pay for building and formatting a datetime.
+    """
+    global _timestamp_cache
+    
+    now = int(time.time())
+    cached = _timestamp_cache
+    if cached[0] != now:
+        cached = _timestamp_cache = (now, datetime.fromtimestamp(now).isoformat())
+    return cached[1]
+
+_TIMESTAMP_PLACEHOLDER = '__TIMESTAMP__'
+
+
+def _error_template(message: str, error_code: str, **extra) -> tuple:
+    """
+    Pre-encode an error response body whose only varying field is the timestamp.
+    
+    Args:
+        message: Error message
+        error_code: Machine-readable error code
+        **extra: Further constant fields, appended after the timestamp
+    
+    Returns:
+        (prefix, suffix) bytes to place around the encoded timestamp
+    """
+    body = fast_json.dumps({
+        'error': message,
+        'error_code': error_code,
+        'timestamp': _TIMESTAMP_PLACEHOLDER,
+        **extra
+    })
+    prefix, suffix = body.split(_TIMESTAMP_PLACEHOLDER.encode())
+    return prefix, suffix
+
+
+def _render_template(template: tuple) -> bytes:
+    """Fill the current timestamp into a template from _error_template."""
+    prefix, suffix = template
+    return prefix + now_iso().encode() + suffix
+
+
+# Bodies of the error responses that carry no request-specific data
+_CONCURRENT_ACCESS_BODY = _error_template(
+    'Service temporarily unavailable due to high traffic. Please try again.',
+    'CONCURRENT_ACCESS', retry_after=1)  # Suggest retry after 1 second
+_PAYLOAD_TOO_LARGE_BODY = _error_template('Request payload too large.', 'PAYLOAD_TOO_LARGE')
+_UNSUPPORTED_MEDIA_TYPE_BODY = _error_template(
+    'Unsupported media type. Expected application/json.', 'UNSUPPORTED_MEDIA_TYPE')
+_RATE_LIMIT_EXCEEDED_BODY = _error_template(
+    'Too many requests. Please wait before trying again.',
+    'RATE_LIMIT_EXCEEDED', retry_after=60)  # Suggest retry after 60 seconds
+_INTERNAL_SERVER_ERROR_BODY = _error_template(
+    'Internal server error. Please try again later.', 'INTERNAL_SERVER_ERROR')
+_BAD_GATEWAY_BODY = _error_template('Bad gateway. Service temporarily unavailable.', 'BAD_GATEWAY')
+_SERVICE_UNAVAILABLE_BODY = _error_template(
+    'Service temporarily unavailable. Please try again later.',
+    'SERVICE_UNAVAILABLE', retry_after=30)  # Suggest retry after 30 seconds
+_UNEXPECTED_ERROR_BODY = _error_template(
+    'An unexpected error occurred. Please try again later.', 'UNEXPECTED_ERROR')
+
+# (status code, error code) for each DatabaseError subclass, also used for
+# their own subclasses; anything else is a 500
+_DATABASE_ERROR_STATUS = {
+    ValidationError: (400, 'VALIDATION_ERROR'),
+    CapacityExceededError: (409, 'CAPACITY_EXCEEDED'),
+    NotFoundError: (404, 'NOT_FOUND'),
+}
+
 class APIError(Exception):
     """Custom API error class for structured error responses."""
     
@@ -26,13 +149,18 @@ class APIError(Exception):
 def register_error_handlers(app):
     """Register all error handlers with the Flask app."""
     
+    def static_response(template, status_code):
+        """Build a JSON response from a pre-encoded body template."""
+        return app.response_class(_render_template(template), status=status_code,
+                                  mimetype='application/json')
+    
     @app.errorhandler(APIError)
     def handle_api_error(error):
         """Handle custom API errors."""
         response = {
             'error': error.message,
             'error_code': error.error_code,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         }
         
         if error.details:
@@ -45,27 +173,16 @@ def register_error_handlers(app):
     def handle_database_error(error):
         """Handle database-related errors."""
         error_message = str(error)
-        status_code = 400
-        error_code = 'DATABASE_ERROR'
         
-        # Determine appropriate status code based on error type
-        if "empty" in error_message.lower():
-            status_code = 400
-            error_code = 'VALIDATION_ERROR'
-        elif "maximum" in error_message.lower() or "limit" in error_message.lower():
-            status_code = 409
-            error_code = 'CAPACITY_EXCEEDED'
-        elif "not found" in error_message.lower():
-            status_code = 404
-            error_code = 'NOT_FOUND'
-        else:
-            status_code = 500
-            error_code = 'DATABASE_ERROR'
-            
+        # Determine appropriate status code from the most specific mapped class
+        status_code, error_code = next(
+            (_DATABASE_ERROR_STATUS[cls] for cls in type(error).__mro__ if cls in _DATABASE_ERROR_STATUS),
+            (500, 'DATABASE_ERROR'))
+        
         response = {
             'error': error_message,
             'error_code': error_code,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         }
         
         logger.error(f"Database Error: {error_message}")
@@ -74,15 +191,8 @@ def register_error_handlers(app):
     @app.errorhandler(ConcurrentAccessError)
     def handle_concurrent_access_error(error):
         """Handle concurrent access errors."""
-        response = {
-            'error': 'Service temporarily unavailable due to high traffic. Please try again.',
-            'error_code': 'CONCURRENT_ACCESS',
-            'timestamp': datetime.now().isoformat(),
-            'retry_after': 1  # Suggest retry after 1 second
-        }
-        
         logger.warning(f"Concurrent Access Error: {str(error)}")
-        return jsonify(response), 503
+        return static_response(_CONCURRENT_ACCESS_BODY, 503)
 
     @app.errorhandler(400)
     def handle_bad_request(error):
@@ -90,7 +200,7 @@ def register_error_handlers(app):
         response = {
             'error': 'Bad request. Please check your input.',
             'error_code': 'BAD_REQUEST',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         }
         
         # Try to get more specific error message
@@ -106,7 +216,7 @@ def register_error_handlers(app):
         response = {
             'error': 'Resource not found.',
             'error_code': 'NOT_FOUND',
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now_iso(),
             'path': request.path
         }
         
@@ -119,7 +229,7 @@ def register_error_handlers(app):
         response = {
             'error': f'Method {request.method} not allowed for this endpoint.',
             'error_code': 'METHOD_NOT_ALLOWED',
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': now_iso(),
             'allowed_methods': list(error.valid_methods) if hasattr(error, 'valid_methods') else []
         }
         
@@ -129,79 +239,41 @@ def register_error_handlers(app):
     @app.errorhandler(413)
     def handle_payload_too_large(error):
         """Handle payload too large errors."""
-        response = {
-            'error': 'Request payload too large.',
-            'error_code': 'PAYLOAD_TOO_LARGE',
-            'timestamp': datetime.now().isoformat()
-        }
-        
         logger.warning(f"Payload Too Large: {request.url}")
-        return jsonify(response), 413
+        return static_response(_PAYLOAD_TOO_LARGE_BODY, 413)
 
     @app.errorhandler(415)
     def handle_unsupported_media_type(error):
         """Handle unsupported media type errors."""
-        response = {
-            'error': 'Unsupported media type. Expected application/json.',
-            'error_code': 'UNSUPPORTED_MEDIA_TYPE',
-            'timestamp': datetime.now().isoformat()
-        }
-        
         logger.warning(f"Unsupported Media Type: {request.url}")
-        return jsonify(response), 415
+        return static_response(_UNSUPPORTED_MEDIA_TYPE_BODY, 415)
 
     @app.errorhandler(429)
     def handle_rate_limit_exceeded(error):
         """Handle rate limit exceeded errors."""
-        response = {
-            'error': 'Too many requests. Please wait before trying again.',
-            'error_code': 'RATE_LIMIT_EXCEEDED',
-            'timestamp': datetime.now().isoformat(),
-            'retry_after': 60  # Suggest retry after 60 seconds
-        }
-        
         logger.warning(f"Rate Limit Exceeded: {request.remote_addr}")
-        return jsonify(response), 429
+        return static_response(_RATE_LIMIT_EXCEEDED_BODY, 429)
 
     @app.errorhandler(500)
     def handle_internal_server_error(error):
         """Handle internal server errors."""
-        response = {
-            'error': 'Internal server error. Please try again later.',
-            'error_code': 'INTERNAL_SERVER_ERROR',
-            'timestamp': datetime.now().isoformat()
-        }
-        
         # Log the full traceback for debugging
         logger.error(f"Internal Server Error: {request.url}")
-        logger.error(traceback.format_exc())
+        log_traceback()
         
-        return jsonify(response), 500
+        return static_response(_INTERNAL_SERVER_ERROR_BODY, 500)
 
     @app.errorhandler(502)
     def handle_bad_gateway(error):
         """Handle bad gateway errors."""
-        response = {
-            'error': 'Bad gateway. Service temporarily unavailable.',
-            'error_code': 'BAD_GATEWAY',
-            'timestamp': datetime.now().isoformat()
-        }
-        
         logger.error(f"Bad Gateway: {request.url}")
-        return jsonify(response), 502
+        return static_response(_BAD_GATEWAY_BODY, 502)
 
     @app.errorhandler(503)
     def handle_service_unavailable(error):
         """Handle service unavailable errors."""
-        response = {
-            'error': 'Service temporarily unavailable. Please try again later.',
-            'error_code': 'SERVICE_UNAVAILABLE',
-            'timestamp': datetime.now().isoformat(),
-            'retry_after': 30  # Suggest retry after 30 seconds
-        }
-        
         logger.error(f"Service Unavailable: {request.url}")
-        return jsonify(response), 503
+        return static_response(_SERVICE_UNAVAILABLE_BODY, 503)
 
     @app.errorhandler(HTTPException)
     def handle_http_exception(error):
@@ -209,7 +281,7 @@ def register_error_handlers(app):
         response = {
             'error': error.description or 'An error occurred.',
             'error_code': 'HTTP_ERROR',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         }
         
         logger.warning(f"HTTP Exception: {error.code} - {request.url}")
@@ -218,22 +290,25 @@ def register_error_handlers(app):
     @app.errorhandler(Exception)
     def handle_unexpected_error(error):
         """Handle any unexpected errors."""
-        response = {
-            'error': 'An unexpected error occurred. Please try again later.',
-            'error_code': 'UNEXPECTED_ERROR',
-            'timestamp': datetime.now().isoformat()
-        }
-        
         # Log the full traceback for debugging
         logger.error(f"Unexpected Error: {request.url}")
         logger.error(f"Error type: {type(error).__name__}")
         logger.error(f"Error message: {str(error)}")
-        logger.error(traceback.format_exc())
+        log_traceback()
         
-        return jsonify(response), 500
+        return static_response(_UNEXPECTED_ERROR_BODY, 500)
 
 def validate_json_request(required_fields=None):
-    """Decorator to validate JSON requests."""
+    """
+    Decorator to validate JSON requests.
+    
+    The parsed body is stored on flask.g as ``g.json`` so the wrapped view can
+    use it without going back through request.get_json().
+    """
+    # Freeze the field list once at decoration time (a tuple keeps the
+    # declared order for the missing-fields message)
+    required_fields = tuple(required_fields or ())
+    
     def decorator(f):
         def wrapper(*args, **kwargs):
             # Check if request has JSON content type
@@ -261,20 +336,21 @@ def validate_json_request(required_fields=None):
                     error_code='EMPTY_JSON'
                 )
             
-            # Check required fields
-            if required_fields:
-                missing_fields = []
-                for field in required_fields:
-                    if field not in data or data[field] is None:
-                        missing_fields.append(field)
-                
-                if missing_fields:
-                    raise APIError(
-                        f'Missing required fields: {", ".join(missing_fields)}',
-                        status_code=400,
-                        error_code='MISSING_FIELDS',
-                        details={'missing_fields': missing_fields}
-                    )
+            g.json = data
+            
+            # Check required fields; data.get() returns None for absent keys,
+            # so one pass over the fields catches both absent and null values
+            if required_fields and (not isinstance(data, dict) or None in map(data.get, required_fields)):
+                if isinstance(data, dict):
+                    missing_fields = [field for field in required_fields if data.get(field) is None]
+                else:
+                    missing_fields = list(required_fields)
+                raise APIError(
+                    f'Missing required fields: {", ".join(missing_fields)}',
+                    status_code=400,
+                    error_code='MISSING_FIELDS',
+                    details={'missing_fields': missing_fields}
+                )
             
             return f(*args, **kwargs)
         
@@ -282,8 +358,9 @@ def validate_json_request(required_fields=None):
         return wrapper
     return decorator
 
-def validate_participant_name(name):
-    """Validate participant name."""
+@lru_cache(maxsize=256, typed=True)
+def _validate_participant_name(name):
+    """Validation body behind validate_participant_name()."""
     if not isinstance(name, str):
         raise APIError(
             'Name must be a string',
@@ -315,8 +392,19 @@ def validate_participant_name(name):
     
     return name
 
-def validate_gift_name(name):
-    """Validate gift name."""
+def validate_participant_name(name):
+    """Validate participant name.
+    
+    Results for plain str inputs are memoized; invalid values still raise
+    on every call because exceptions are never cached.
+    """
+    if type(name) is str:
+        return _validate_participant_name(name)
+    return _validate_participant_name.__wrapped__(name)
+
+@lru_cache(maxsize=256, typed=True)
+def _validate_gift_name(name):
+    """Validation body behind validate_gift_name()."""
     if not isinstance(name, str):
         raise APIError(
             'Gift name must be a string',
@@ -341,8 +429,19 @@ def validate_gift_name(name):
     
     return name
 
-def validate_participant_id(participant_id):
-    """Validate participant ID."""
+def validate_gift_name(name):
+    """Validate gift name.
+    
+    Results for plain str inputs are memoized; invalid values still raise
+    on every call because exceptions are never cached.
+    """
+    if type(name) is str:
+        return _validate_gift_name(name)
+    return _validate_gift_name.__wrapped__(name)
+
+@lru_cache(maxsize=128, typed=True)
+def _validate_participant_id(participant_id):
+    """Validation body behind validate_participant_id()."""
     if not isinstance(participant_id, int):
         raise APIError(
             'Participant ID must be an integer',
@@ -357,4 +456,14 @@ def validate_participant_id(participant_id):
             error_code='INVALID_PARTICIPANT_ID_RANGE'
         )
     
-    return participant_id
\ No newline at end of file
+    return participant_id
+
+def validate_participant_id(participant_id):
+    """Validate participant ID.
+    
+    Results for plain int inputs are memoized; invalid values still raise
+    on every call because exceptions are never cached.
+    """
+    if type(participant_id) is int:
+        return _validate_participant_id(participant_id)
+    return _validate_participant_id.__wrapped__(participant_id)
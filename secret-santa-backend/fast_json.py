@@ -0,0 +1,48 @@
+"""
+JSON encoding helpers for the Secret Santa backend.
+Uses orjson when it is installed and falls back to the standard library json module.
+"""
+import json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can
+# catch this one exception type for both implementations
+JSONDecodeError = json.JSONDecodeError
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """
+    Serialize an object to compact UTF-8 encoded JSON.
+    
+    Args:
+        obj: Object to serialize
+        default: Optional fallback for objects JSON can't represent natively
+    
+    Returns:
+        JSON document as bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default)
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data: Any) -> Any:
+    """
+    Deserialize a JSON document.
+    
+    Args:
+        data: JSON document as bytes, bytearray, memoryview or str
+    
+    Returns:
+        Deserialized object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
@@ -2,14 +2,37 @@
 AWS Lambda handler for Secret Santa backend.
 This module adapts the Flask application to work with AWS Lambda and API Gateway.
 """
+import base64
+import io
 import json
 import os
+import sys
+from urllib.parse import urlencode
 
 # Set environment to use S3 database
 os.environ['USE_S3_DATABASE'] = 'true'
 
+# Importing the app creates the S3 client and checks the data object, so that
+# work happens during Lambda init (ahead of any request when provisioned
+# concurrency is on) rather than on the first invocation; nothing
+# request-specific may run at module scope
 from app import app
 
+# CORS headers to include in all responses
+CORS_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+    'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
+}
+
+# Response to CORS preflight requests; the runtime only serializes it
+OPTIONS_RESPONSE = {
+    'statusCode': 200,
+    'headers': CORS_HEADERS,
+    'body': ''
+}
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler function.
@@ -21,74 +44,125 @@ def lambda_handler(event, context):
     Returns:
         API Gateway response object
     """
-    # Extract HTTP method and path
-    http_method = event.get('httpMethod', 'GET')
-    path = event.get('path', '/')
+    if event.get('version') == '2.0':
+        # HTTP API payload format 2.0: method, path and source IP are pre-parsed,
+        # header names arrive lower-cased and cookies are split out
+        http = event['requestContext']['http']
+        http_method = http['method']
+        path = event['rawPath']
+        query_string = event.get('rawQueryString', '')
+        headers = event.get('headers') or {}
+        if event.get('cookies'):
+            headers = dict(headers, cookie='; '.join(event['cookies']))
+        remote_addr = http.get('sourceIp', '')
+    else:
+        # REST API payload format 1.0
+        http_method = event.get('httpMethod', 'GET')
+        path = event.get('path', '/')
+        query_string = event.get('rawQueryString')
+        if query_string is None:
+            query_string = urlencode(event.get('queryStringParameters') or {})
+        headers = event.get('headers') or {}
+        remote_addr = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp', '')
     
     # Handle OPTIONS requests for CORS preflight
     if http_method == 'OPTIONS':
+        return OPTIONS_RESPONSE
+    
+    # Extract body
+    body = event.get('body') or ''
+    if body and event.get('isBase64Encoded', False):
+        body = base64.b64decode(body)
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    
+    environ = _build_environ(http_method, path, query_string, headers, body, remote_addr)
+    
+    try:
+        # Process the request through Flask's WSGI app
+        status = []
+        flask_headers = []
+        
+        def start_response(status_line, response_headers, exc_info=None):
+            status.append(status_line)
+            flask_headers[:] = response_headers
+            return lambda data: None
+        
+        result = app.wsgi_app(environ, start_response)
+        try:
+            response_data = b''.join(result).decode('utf-8')
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        status_code = int(status[0].split(' ', 1)[0])
+        
+        # Return API Gateway compatible response with CORS headers, keeping
+        # Flask's own headers such as ETag so conditional GETs can answer 304
         return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-                'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-            },
-            'body': ''
+            'statusCode': status_code,
+            'headers': {**CORS_HEADERS, **dict(flask_headers)},
+            'body': response_data
+        }
+    except Exception as e:
+        # Handle errors with CORS headers
+        error_response = {
+            'error': str(e),
+            'message': 'Internal server error'
         }
+        return {
+            'statusCode': 500,
+            'headers': CORS_HEADERS,
+            'body': json.dumps(error_response)
+        }
+
+
+def _build_environ(method, path, query_string, headers, body, remote_addr):
+    """
+    Build a WSGI environ for an API Gateway request.
     
-    # Extract headers
-    headers = event.get('headers', {})
+    Args:
+        method: HTTP method
+        path: Request path
+        query_string: Encoded query string
+        headers: Request headers
+        body: Request body as bytes
+        remote_addr: Caller's source IP
     
-    # Extract query parameters
-    query_params = event.get('queryStringParameters') or {}
+    Returns:
+        WSGI environ dictionary
+    """
+    environ = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        # WSGI carries the path as latin-1 decoded bytes
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': 'lambda',
+        'SERVER_PORT': '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': remote_addr,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'https',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
     
-    # Extract body
-    body = event.get('body', '')
-    if body and event.get('isBase64Encoded', False):
-        import base64
-        body = base64.b64decode(body).decode('utf-8')
+    for name, value in headers.items():
+        key = name.upper().replace('-', '_')
+        if key == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif key == 'CONTENT_LENGTH':
+            # The length of the decoded body is authoritative
+            continue
+        else:
+            environ['HTTP_' + key] = value
     
-    # CORS headers to include in all responses
-    cors_headers = {
-        'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-    }
+    if 'HTTP_HOST' in environ:
+        environ['SERVER_NAME'] = environ['HTTP_HOST'].split(':', 1)[0]
     
-    # Create a test request context for Flask
-    with app.test_request_context(
-        path=path,
-        method=http_method,
-        headers=headers,
-        query_string=query_params,
-        data=body,
-        content_type=headers.get('Content-Type', 'application/json')
-    ):
-        try:
-            # Process the request through Flask
-            response = app.full_dispatch_request()
-            
-            # Extract response data
-            response_data = response.get_data(as_text=True)
-            status_code = response.status_code
-            
-            # Return API Gateway compatible response with CORS headers
-            return {
-                'statusCode': status_code,
-                'headers': cors_headers,
-                'body': response_data
-            }
-        except Exception as e:
-            # Handle errors with CORS headers
-            error_response = {
-                'error': str(e),
-                'message': 'Internal server error'
-            }
-            return {
-                'statusCode': 500,
-                'headers': cors_headers,
-                'body': json.dumps(error_response)
-            }
+    return environ
@@ -2,13 +2,20 @@
 Data models for the Secret Santa game application.
 """
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 import json
 
+# Keys of a complete stored record; a record with exactly these keys can
+# serve as the model's dictionary form as-is
+_PARTICIPANT_FIELDS = frozenset(("id", "name", "registration_timestamp"))
+_GIFT_FIELDS = frozenset(("id", "name", "steal_count", "is_locked", "current_owner", "steal_history"))
+
 
 class Participant:
     """Model representing a game participant."""
     
+    __slots__ = ('id', 'name', 'registration_timestamp', '_dict_cache')
+    
     def __init__(self, participant_id: int, name: str, registration_timestamp: Optional[str] = None):
         """
         Initialize a participant.
@@ -22,22 +29,44 @@ class Participant:
         self.name = name
         self.registration_timestamp = registration_timestamp or datetime.now().isoformat()
     
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute and drop the cached dictionary form."""
+        object.__setattr__(self, name, value)
+        if name != '_dict_cache':
+            object.__setattr__(self, '_dict_cache', None)
+    
     def to_dict(self) -> Dict[str, Any]:
-        """Convert participant to dictionary for JSON serialization."""
-        return {
-            "id": self.id,
-            "name": self.name,
-            "registration_timestamp": self.registration_timestamp
-        }
+        """
+        Convert participant to dictionary for JSON serialization.
+        
+        The dictionary is cached until an attribute changes; treat it as read-only.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = {
+                "id": self.id,
+                "name": self.name,
+                "registration_timestamp": self.registration_timestamp
+            }
+        return self._dict_cache
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Participant':
-        """Create participant from dictionary."""
-        return cls(
-            participant_id=data["id"],
-            name=data["name"],
-            registration_timestamp=data["registration_timestamp"]
-        )
+        """
+        Create participant from dictionary.
+        
+        A complete record is kept as the cached dictionary form, so models
+        read only to be serialized again don't build a second dictionary.
+        The record must not be modified afterwards.
+        """
+        # Fill the slots directly rather than going through __init__ and
+        # the cache-clearing __setattr__ override once per field
+        participant = cls.__new__(cls)
+        set_slot = object.__setattr__
+        set_slot(participant, 'id', data["id"])
+        set_slot(participant, 'name', data["name"])
+        set_slot(participant, 'registration_timestamp', data["registration_timestamp"])
+        set_slot(participant, '_dict_cache', data if data.keys() == _PARTICIPANT_FIELDS else None)
+        return participant
     
     def __repr__(self) -> str:
         return f"Participant(id={self.id}, name='{self.name}')"
@@ -46,6 +75,8 @@ class Participant:
 class Gift:
     """Model representing a gift in the game."""
     
+    __slots__ = ('id', 'name', 'steal_count', 'is_locked', 'current_owner', 'steal_history', '_dict_cache')
+    
     def __init__(self, gift_id: str, name: str, current_owner: Optional[int] = None):
         """
         Initialize a gift.
@@ -62,6 +93,12 @@ class Gift:
         self.current_owner = current_owner
         self.steal_history: List[int] = []
     
+    def __setattr__(self, name: str, value: Any) -> None:
+        """Set an attribute and drop the cached dictionary form."""
+        object.__setattr__(self, name, value)
+        if name != '_dict_cache':
+            object.__setattr__(self, '_dict_cache', None)
+    
     def steal_gift(self, new_owner_id: int) -> bool:
         """
         Record a gift steal.
@@ -77,6 +114,7 @@ class Gift:
         
         if self.current_owner is not None:
             self.steal_history.append(self.current_owner)
+            self._dict_cache = None
         
         self.current_owner = new_owner_id
         self.steal_count += 1
@@ -103,27 +141,40 @@ class Gift:
         return True
     
     def to_dict(self) -> Dict[str, Any]:
-        """Convert gift to dictionary for JSON serialization."""
-        return {
-            "id": self.id,
-            "name": self.name,
-            "steal_count": self.steal_count,
-            "is_locked": self.is_locked,
-            "current_owner": self.current_owner,
-            "steal_history": self.steal_history
-        }
+        """
+        Convert gift to dictionary for JSON serialization.
+        
+        The dictionary is cached until an attribute changes; treat it as read-only.
+        """
+        if self._dict_cache is None:
+            self._dict_cache = {
+                "id": self.id,
+                "name": self.name,
+                "steal_count": self.steal_count,
+                "is_locked": self.is_locked,
+                "current_owner": self.current_owner,
+                "steal_history": self.steal_history
+            }
+        return self._dict_cache
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Gift':
-        """Create gift from dictionary."""
-        gift = cls(
-            gift_id=data["id"],
-            name=data["name"],
-            current_owner=data.get("current_owner")
-        )
-        gift.steal_count = data.get("steal_count", 0)
-        gift.is_locked = data.get("is_locked", False)
-        gift.steal_history = data.get("steal_history", [])
+        """
+        Create gift from dictionary.
+        
+        As with Participant.from_dict, a complete record becomes the cached
+        dictionary form and must not be modified afterwards, and the slots
+        are filled without going through __init__.
+        """
+        gift = cls.__new__(cls)
+        set_slot = object.__setattr__
+        set_slot(gift, 'id', data["id"])
+        set_slot(gift, 'name', data["name"])
+        set_slot(gift, 'steal_count', data.get("steal_count", 0))
+        set_slot(gift, 'is_locked', data.get("is_locked", False))
+        set_slot(gift, 'current_owner', data.get("current_owner"))
+        set_slot(gift, 'steal_history', list(data.get("steal_history", [])))
+        set_slot(gift, '_dict_cache', data if data.keys() == _GIFT_FIELDS else None)
         return gift
     
     def __repr__(self) -> str:
@@ -133,17 +184,39 @@ class Gift:
 class GameState:
     """Model representing the overall game state."""
     
+    __slots__ = ('current_turn', 'turn_order', 'game_phase', '_turn_index')
+    
     def __init__(self):
         """Initialize game state."""
         self.current_turn: Optional[int] = None
         self.turn_order: List[int] = []
         self.game_phase = "registration"  # registration, active, completed
+        # Position of current_turn in turn_order when last known; only a hint,
+        # since callers may assign current_turn and turn_order directly
+        self._turn_index = -1
+    
+    def _current_index(self) -> int:
+        """
+        Get the position of current_turn in turn_order.
+        
+        Returns:
+            Index of the current turn
+        
+        Raises:
+            ValueError: If current_turn is not in turn_order
+        """
+        index = self._turn_index
+        if 0 <= index < len(self.turn_order) and self.turn_order[index] == self.current_turn:
+            return index
+        index = self._turn_index = self.turn_order.index(self.current_turn)
+        return index
     
     def set_turn_order(self, participant_ids: List[int]) -> None:
         """Set the turn order for the game."""
         self.turn_order = participant_ids.copy()
         if self.turn_order and self.current_turn is None:
             self.current_turn = self.turn_order[0]
+            self._turn_index = 0
     
     def next_turn(self) -> Optional[int]:
         """
@@ -156,7 +229,7 @@ class GameState:
             return None
         
         try:
-            current_index = self.turn_order.index(self.current_turn)
+            current_index = self._current_index()
             next_index = current_index + 1
             
             if next_index >= len(self.turn_order):
@@ -166,6 +239,7 @@ class GameState:
                 return None
             else:
                 self.current_turn = self.turn_order[next_index]
+                self._turn_index = next_index
                 return self.current_turn
         except ValueError:
             # Current turn not in turn order, reset to first
@@ -186,13 +260,14 @@ class GameState:
         if self.game_phase == "completed":
             self.game_phase = "active"
             self.current_turn = self.turn_order[-1] if self.turn_order else None
+            self._turn_index = len(self.turn_order) - 1
             return self.current_turn
         
         if self.current_turn is None:
             return None
         
         try:
-            current_index = self.turn_order.index(self.current_turn)
+            current_index = self._current_index()
             
             if current_index == 0:
                 # Already at first turn, can't go back further
@@ -200,6 +275,7 @@ class GameState:
             else:
                 previous_index = current_index - 1
                 self.current_turn = self.turn_order[previous_index]
+                self._turn_index = previous_index
                 # Ensure game is in active state if we're going back
                 if self.game_phase == "completed":
                     self.game_phase = "active"
@@ -228,9 +304,76 @@ class GameState:
         """Create game state from dictionary."""
         game_state = cls()
         game_state.current_turn = data.get("current_turn")
-        game_state.turn_order = data.get("turn_order", [])
+        game_state.turn_order = list(data.get("turn_order", []))
         game_state.game_phase = data.get("game_phase", "registration")
         return game_state
     
     def __repr__(self) -> str:
-        return f"GameState(phase='{self.game_phase}', current_turn={self.current_turn}, participants={len(self.turn_order)})"
\ No newline at end of file
+        return f"GameState(phase='{self.game_phase}', current_turn={self.current_turn}, participants={len(self.turn_order)})"
+
+
+class Snapshot:
+    """
+    Participants, gifts and game state read from the database in one go.
+    
+    Models are built from the stored dictionaries on first access, so callers
+    only pay for the parts they use. Iterating yields (participants, gifts,
+    game_state), so it unpacks like a 3-tuple.
+    """
+    
+    __slots__ = ('_participant_data', '_gift_data', '_game_state_data',
+                 '_participants', '_gifts', '_game_state')
+    
+    def __init__(self, participant_data: Iterable[Dict[str, Any]], gift_data: Iterable[Dict[str, Any]],
+                 game_state_data: Dict[str, Any]):
+        """
+        Initialize a snapshot.
+        
+        Args:
+            participant_data: Participant dictionaries, ordered by ID
+            gift_data: Gift dictionaries
+            game_state_data: Game state dictionary
+        """
+        self._participant_data = participant_data
+        self._gift_data = gift_data
+        self._game_state_data = game_state_data
+        self._participants: Optional[List[Participant]] = None
+        self._gifts: Optional[List[Gift]] = None
+        self._game_state: Optional[GameState] = None
+    
+    @property
+    def participants(self) -> List[Participant]:
+        """Registered participants."""
+        if self._participants is None:
+            self._participants = [Participant.from_dict(p) for p in self._participant_data]
+        return self._participants
+    
+    @property
+    def gifts(self) -> List[Gift]:
+        """All gifts."""
+        if self._gifts is None:
+            self._gifts = [Gift.from_dict(g) for g in self._gift_data]
+        return self._gifts
+    
+    @property
+    def game_state(self) -> GameState:
+        """Current game state."""
+        if self._game_state is None:
+            self._game_state = GameState.from_dict(self._game_state_data)
+        return self._game_state
+    
+    @property
+    def participant_count(self) -> int:
+        """Number of participants, without building the models."""
+        return len(self._participant_data)
+    
+    @property
+    def gift_count(self) -> int:
+        """Number of gifts, without building the models."""
+        return len(self._gift_data)
+    
+    def __iter__(self) -> Iterator[Any]:
+        return iter((self.participants, self.gifts, self.game_state))
+    
+    def __repr__(self) -> str:
+        return f"Snapshot(participants={self.participant_count}, gifts={self.gift_count})"
@@ -2,28 +2,62 @@
 S3-based database operations for AWS Lambda deployment.
 Adapts the file-based database to use S3 for persistence.
 """
-import json
+import bisect
 import os
+import random
+import threading
 import time
 import uuid
 from datetime import datetime
-from typing import Dict, List, Optional, Any, Tuple
-from models import Participant, Gift, GameState
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError, HTTPClientError, IncompleteReadError
+from botocore.exceptions import ConnectionError as BotoConnectionError
+import fast_json
+from models import Participant, Gift, GameState, Snapshot
+# Share the exception classes with the file backend so the error handlers
+# registered in error_handlers.py catch them regardless of the storage mode
+from database import DatabaseError, ConcurrentAccessError
+from database import ValidationError, CapacityExceededError, NotFoundError
+from database import MAX_PARTICIPANTS, new_gift_id, pick_free_number
 
+# One S3 client per process, shared by all S3Database instances so warm
+# Lambda invocations and repeated constructions reuse its connection pool
+_s3_client = None
+_s3_client_lock = threading.Lock()
+# S3 error codes that mean a conflicting write or a transient failure; any
+# other ClientError (AccessDenied, NoSuchBucket, ...) fails the same way on retry
+_RETRYABLE_ERROR_CODES = frozenset((
+    'PreconditionFailed', 'ConditionalRequestConflict', 'OperationAborted',
+    'SlowDown', 'Throttling', 'ThrottlingException', 'RequestTimeout',
+    'InternalError', 'ServiceUnavailable', '500', '503'
+))
 
-class DatabaseError(Exception):
-    """Custom exception for database operations."""
-    pass
+# (bucket, key) pairs already checked or created by this process
+_initialized_objects: Set[Tuple[str, str]] = set()
 
 
-class ConcurrentAccessError(Exception):
-    """Exception raised when concurrent access conflicts occur."""
-    pass
+def _get_s3_client():
+    """Get the shared S3 client, creating it on first use."""
+    global _s3_client
+    
+    if _s3_client is None:
+        with _s3_client_lock:
+            if _s3_client is None:
+                # Threaded servers run one S3 call per in-flight request; size the
+                # connection pool for that and keep idle connections alive between calls
+                _s3_client = boto3.client('s3', config=Config(max_pool_connections=50, tcp_keepalive=True))
+    return _s3_client
 
 
 class S3Database:
     """S3-based database with JSON serialization and optimistic locking."""
     
+    # Upper bound in seconds on the measured retry backoff slot
+    MAX_RETRY_SLOT = 1.0
+    
     def __init__(self, bucket_name: Optional[str] = None, object_key: str = 'game_data.json', 
                  max_retries: int = 5, retry_delay: float = 0.1):
         """
@@ -35,8 +69,6 @@ class S3Database:
             max_retries: Maximum number of retry attempts for operations
             retry_delay: Delay between retry attempts in seconds
         """
-        import boto3
-        
         self.bucket_name = bucket_name or os.environ.get('DATA_BUCKET')
         if not self.bucket_name:
             raise ValueError("S3 bucket name must be provided or set in DATA_BUCKET environment variable")
@@ -44,12 +76,31 @@ class S3Database:
         self.object_key = object_key
         self.max_retries = max_retries
         self.retry_delay = retry_delay
-        self.s3_client = boto3.client('s3')
+        self.s3_client = _get_s3_client()
+        # (etag, data) of the last object body seen; swapped as a whole so
+        # concurrent readers always see a matching pair
+        self._cache: Optional[Tuple[str, Dict[str, Any]]] = None
+        # (data, {gift id: position in data["gifts"]}) for the cached body
+        self._gift_index: Tuple[Optional[Dict[str, Any]], Dict[str, int]] = (None, {})
+        # Per-thread (etag, data) validated by get_version, used by the next read
+        self._local = threading.local()
+        # Storage and transport failures worth retrying; anything else, such
+        # as a DatabaseError, an error raised by a change function or a
+        # client-side ParamValidationError, is not
+        self._retryable_errors = (ClientError, HTTPClientError, BotoConnectionError,
+                                  IncompleteReadError, OSError, fast_json.JSONDecodeError)
         
         self._ensure_data_file_exists()
     
     def _ensure_data_file_exists(self) -> None:
-        """Create the data file with initial structure if it doesn't exist."""
+        """
+        Create the data file with initial structure if it doesn't exist.
+        
+        The check runs once per object and process, not once per instance.
+        """
+        if (self.bucket_name, self.object_key) in _initialized_objects:
+            return
+        
         try:
             self.s3_client.head_object(Bucket=self.bucket_name, Key=self.object_key)
         except self.s3_client.exceptions.ClientError as e:
@@ -64,23 +115,52 @@ class S3Database:
                         "game_phase": "registration"
                     },
                     "metadata": {
-                        "last_updated": datetime.now().isoformat(),
                         "version": "1.0"
                     }
                 }
                 self._write_data_to_s3(initial_data)
             else:
                 raise
+        _initialized_objects.add((self.bucket_name, self.object_key))
     
     def _read_data_from_s3(self) -> Dict[str, Any]:
-        """Read data from S3."""
+        """
+        Read data from S3.
+        
+        A body get_version just validated for this thread is used once
+        instead of revalidating it again.
+        """
+        validated = getattr(self._local, 'validated', None)
+        if validated is not None:
+            self._local.validated = None
+            return validated[1]
+        _, data = self._read_versioned_data_from_s3()
+        return data
+    
+    def _read_versioned_data_from_s3(self) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Read data from S3 together with the ETag it was read at.
+        
+        The last body seen is kept in memory and revalidated with a conditional
+        GET, so an unchanged object costs a 304 instead of a download and parse.
+        The returned data is shared with the cache and must not be modified.
+        
+        Returns:
+            Tuple of (etag, data); etag is None if the object doesn't exist
+        """
+        cache = self._cache
+        request = {'Bucket': self.bucket_name, 'Key': self.object_key}
+        if cache is not None:
+            request['IfNoneMatch'] = cache[0]
+        
         try:
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.object_key)
-            data = json.loads(response['Body'].read().decode('utf-8'))
-            return data
+            response = self.s3_client.get_object(**request)
+            data = fast_json.loads(response['Body'].read())
+            self._cache = (response['ETag'], data)
+            return response['ETag'], data
         except self.s3_client.exceptions.NoSuchKey:
             # If file doesn't exist, return initial structure
-            return {
+            return None, {
                 "participants": [],
                 "gifts": [],
                 "game_state": {
@@ -93,22 +173,52 @@ class S3Database:
                     "version": "1.0"
                 }
             }
+        except self.s3_client.exceptions.ClientError as e:
+            # NoSuchKey is handled above; a 304 means the cached body is current
+            if cache is not None and e.response['Error']['Code'] in ('304', 'NotModified'):
+                return cache
+            raise
     
-    def _write_data_to_s3(self, data: Dict[str, Any]) -> None:
-        """Write data to S3."""
+    def _write_data_to_s3(self, data: Dict[str, Any], if_match: Optional[str] = None,
+                          if_none_match: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Write data to S3.
+        
+        Args:
+            data: Data to write
+            if_match: Only write if the object still has this ETag
+            if_none_match: Pass '*' to only write if the object doesn't exist
+        
+        Returns:
+            The decoded copy of the written data that is now cached
+        
+        Raises:
+            ClientError: PreconditionFailed if a condition no longer holds
+        """
+        # The single place a written document gets its timestamp
         data['metadata']['last_updated'] = datetime.now().isoformat()
-        json_data = json.dumps(data, indent=2)
-        
-        self.s3_client.put_object(
-            Bucket=self.bucket_name,
-            Key=self.object_key,
-            Body=json_data.encode('utf-8'),
-            ContentType='application/json'
-        )
+        body = fast_json.dumps(data)
+        
+        request = {
+            'Bucket': self.bucket_name,
+            'Key': self.object_key,
+            'Body': body,
+            'ContentType': 'application/json'
+        }
+        if if_match is not None:
+            request['IfMatch'] = if_match
+        if if_none_match is not None:
+            request['IfNoneMatch'] = if_none_match
+        
+        response = self.s3_client.put_object(**request)
+        # Cache a decoded copy, since data may share lists with live models
+        cached = fast_json.loads(body)
+        self._cache = (response['ETag'], cached)
+        return cached
     
     def _retry_operation(self, operation, *args, **kwargs):
         """
-        Retry an operation with exponential backoff.
+        Retry an operation with jittered slot backoff.
         
         Args:
             operation: Function to retry
@@ -120,37 +230,162 @@ class S3Database:
             
         Raises:
             ConcurrentAccessError: If all retries fail
+            DatabaseError: If S3 rejects a request for a reason retrying can't fix
         """
         last_exception = None
+        start = time.monotonic()
+        slot = None
         
         for attempt in range(self.max_retries):
             try:
                 return operation(*args, **kwargs)
-            except Exception as e:
+            except self._retryable_errors as e:
+                if isinstance(e, ClientError):
+                    code = e.response.get('Error', {}).get('Code')
+                    if code not in _RETRYABLE_ERROR_CODES:
+                        raise DatabaseError(f"S3 request failed: {code}") from e
                 last_exception = e
+                if slot is None:
+                    # Size the backoff slot by how long a failed attempt takes,
+                    # capped so one slow failure can't stretch every wait
+                    slot = max(min(time.monotonic() - start, self.MAX_RETRY_SLOT), self.retry_delay)
                 if attempt < self.max_retries - 1:
-                    # Exponential backoff
-                    delay = self.retry_delay * (2 ** attempt)
-                    time.sleep(delay)
+                    # Jittered slot backoff: a random wait of up to attempt + 1
+                    # slots keeps colliding callers from waking in lockstep
+                    time.sleep(random.uniform(0, attempt + 1) * slot)
                 continue
         
         raise ConcurrentAccessError(f"Operation failed after {self.max_retries} attempts: {last_exception}")
     
-    def read_all_data(self) -> Tuple[List[Participant], List[Gift], GameState]:
+    def _mutate(self, change):
+        """
+        Apply a change with optimistic concurrency control.
+        
+        The change runs against the current data and the result is written back
+        with a conditional PUT on the ETag it was read at. If another writer got
+        there first, S3 rejects the PUT with PreconditionFailed and the whole
+        read-modify-write is retried by _retry_operation with backoff.
+        
+        Args:
+            change: Function taking (participants, gifts, game_state), mutating
+                them in place and returning (changed, result); nothing is
+                written when changed is False
+        
+        Returns:
+            The result returned by change
+        """
+        etag, data = self._read_versioned_data_from_s3()
+        participants = [Participant.from_dict(p) for p in data.get("participants", [])]
+        gifts = [Gift.from_dict(g) for g in data.get("gifts", [])]
+        game_state = GameState.from_dict(data.get("game_state", {}))
+        
+        changed, result = change(participants, gifts, game_state)
+        
+        if changed:
+            self._write_back(etag, {
+                "participants": [p.to_dict() for p in participants],
+                "gifts": [g.to_dict() for g in gifts],
+                "game_state": game_state.to_dict()
+            })
+        
+        return result
+    
+    def _mutate_gift(self, gift_id: str, change):
+        """
+        Apply a change to a single gift with optimistic concurrency control.
+        
+        The gift is looked up through an id index over the raw records, so only
+        the targeted gift is turned into a model and re-serialized; the other
+        records are written back as they were read. The index is kept for the
+        cached body and carried over to the body written here, so a series of
+        gift changes doesn't rebuild it.
+        
+        Args:
+            gift_id: ID of the gift to change
+            change: Function taking the Gift (or None if there is no gift with
+                that id), mutating it in place and returning (changed, result)
+        
+        Returns:
+            The result returned by change
+        """
+        etag, data = self._read_versioned_data_from_s3()
+        gifts = data.get("gifts", [])
+        
+        indexed_data, gifts_by_id = self._gift_index
+        if indexed_data is not data:
+            gifts_by_id = {g["id"]: index for index, g in enumerate(gifts)}
+            self._gift_index = (data, gifts_by_id)
+        
+        index = gifts_by_id.get(gift_id)
+        gift = Gift.from_dict(gifts[index]) if index is not None else None
+        
+        changed, result = change(gift)
+        
+        if changed:
+            # Copy the list so the cached data is untouched if the PUT fails
+            gifts = list(gifts)
+            gifts[index] = gift.to_dict()
+            written = self._write_back(etag, {
+                "participants": data.get("participants", []),
+                "gifts": gifts,
+                "game_state": data.get("game_state", {})
+            })
+            # Gift positions are unchanged in the body just written
+            self._gift_index = (written, gifts_by_id)
+        
+        return result
+    
+    def _write_back(self, etag: Optional[str], data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Write changed data conditionally on the ETag it was read at.
+        
+        Args:
+            etag: ETag of the object the change was based on, None if it did not exist
+            data: Participants, gifts and game state to store
+        
+        Returns:
+            The decoded copy of the written data that is now cached
+        """
+        data["metadata"] = {"version": "1.0"}
+        if etag is None:
+            return self._write_data_to_s3(data, if_none_match='*')
+        return self._write_data_to_s3(data, if_match=etag)
+    
+    def get_version(self) -> str:
+        """
+        Get a cheap token identifying the current state of the data object.
+        
+        Revalidates the cached body with the same conditional GET reads use,
+        so an unchanged object costs a 304. The validated body is kept for the
+        calling thread and the next read uses it without another request, so
+        the data always matches the version; end_request() drops it if no
+        read follows.
+        
+        Returns:
+            The S3 ETag of the data object (without quotes)
+        """
+        self._local.validated = None
+        etag, data = self._retry_operation(self._read_versioned_data_from_s3)
+        if etag is None:
+            # Never match a previous version while the object is missing
+            return uuid.uuid4().hex
+        self._local.validated = (etag, data)
+        return etag.strip('"')
+    
+    def end_request(self) -> None:
+        """Drop a body validated by get_version that no read has used."""
+        self._local.validated = None
+    
+    def read_all_data(self) -> Snapshot:
         """
         Read all data from the database.
         
         Returns:
-            Tuple of (participants, gifts, game_state)
+            Snapshot of (participants, gifts, game_state)
         """
         def _read():
             data = self._read_data_from_s3()
-            
-            participants = [Participant.from_dict(p) for p in data.get("participants", [])]
-            gifts = [Gift.from_dict(g) for g in data.get("gifts", [])]
-            game_state = GameState.from_dict(data.get("game_state", {}))
-            
-            return participants, gifts, game_state
+            return Snapshot(data.get("participants", []), data.get("gifts", []), data.get("game_state", {}))
         
         return self._retry_operation(_read)
     
@@ -169,7 +404,6 @@ class S3Database:
                 "gifts": [g.to_dict() for g in gifts],
                 "game_state": game_state.to_dict(),
                 "metadata": {
-                    "last_updated": datetime.now().isoformat(),
                     "version": "1.0"
                 }
             }
@@ -191,51 +425,33 @@ class S3Database:
         Raises:
             DatabaseError: If participant limit reached or name is invalid
         """
-        def _add_participant():
-            # Read current data
-            data = self._read_data_from_s3()
-            participants = [Participant.from_dict(p) for p in data.get("participants", [])]
-            gifts = [Gift.from_dict(g) for g in data.get("gifts", [])]
-            game_state = GameState.from_dict(data.get("game_state", {}))
-            
+        def _add_participant(participants, gifts, game_state):
             # Validate name
             if not name or not name.strip():
-                raise DatabaseError("Participant name cannot be empty")
+                raise ValidationError("Participant name cannot be empty")
             
             # Check participant limit
-            if len(participants) >= 100:
-                raise DatabaseError("Maximum number of participants (100) reached")
+            if len(participants) >= MAX_PARTICIPANTS:
+                raise CapacityExceededError(f"Maximum number of participants ({MAX_PARTICIPANTS}) reached")
             
             # Generate random available number
-            import random
-            used_numbers = {p.id for p in participants}
-            available_numbers = [i for i in range(1, 101) if i not in used_numbers]
-            
-            if not available_numbers:
-                raise DatabaseError("No available participant numbers")
-            
-            next_number = random.choice(available_numbers)
+            next_number = pick_free_number(p.id for p in participants)
             
-            # Create new participant
+            # Create new participant, keeping the stored list ordered by ID
             new_participant = Participant(next_number, name.strip())
-            participants.append(new_participant)
+            bisect.insort(participants, new_participant, key=attrgetter('id'))
             
-            # Write back to S3
-            self.write_all_data(participants, gifts, game_state)
-            
-            return new_participant
+            return True, new_participant
         
-        return self._retry_operation(_add_participant)
+        return self._retry_operation(self._mutate, _add_participant)
     
     def get_participants(self) -> List[Participant]:
         """Get all participants."""
-        participants, _, _ = self.read_all_data()
-        return participants
+        return self.read_all_data().participants
     
     def get_participant_count(self) -> int:
         """Get the current number of participants."""
-        participants = self.get_participants()
-        return len(participants)
+        return self.read_all_data().participant_count
     
     def add_gift(self, name: str, owner_id: Optional[int] = None) -> Gift:
         """
@@ -248,106 +464,85 @@ class S3Database:
         Returns:
             Created gift
         """
-        def _add_gift():
-            participants, gifts, game_state = self.read_all_data()
-            
+        def _add_gift(participants, gifts, game_state):
             # Validate gift name
             if not name or not name.strip():
-                raise DatabaseError("Gift name cannot be empty")
+                raise ValidationError("Gift name cannot be empty")
             
             # Generate unique gift ID
-            gift_id = str(uuid.uuid4())
+            gift_id = new_gift_id({gift.id for gift in gifts})
             
             # Create new gift
             new_gift = Gift(gift_id, name.strip(), owner_id)
             gifts.append(new_gift)
             
-            # Write back to S3
-            self.write_all_data(participants, gifts, game_state)
-            
-            return new_gift
+            return True, new_gift
         
-        return self._retry_operation(_add_gift)
+        return self._retry_operation(self._mutate, _add_gift)
     
-    def steal_gift_atomic(self, gift_id: str, new_owner_id: int) -> bool:
+    def steal_gift_atomic(self, gift_id: str, new_owner_id: int,
+                          return_gift: bool = False) -> Union[bool, Tuple[bool, Gift]]:
         """
         Atomically steal a gift.
         
         Args:
             gift_id: ID of gift to steal
             new_owner_id: ID of participant stealing the gift
+            return_gift: Also return the gift as it stands after the operation
             
         Returns:
-            True if steal was successful, False if gift is locked
+            True if steal was successful, False if gift is locked.
+            With return_gift, a (success, gift) tuple.
             
         Raises:
             DatabaseError: If gift not found
         """
-        def _steal_gift():
-            participants, gifts, game_state = self.read_all_data()
-            
-            # Find the gift
-            gift = None
-            for g in gifts:
-                if g.id == gift_id:
-                    gift = g
-                    break
-            
+        def _steal_gift(gift):
             if gift is None:
-                raise DatabaseError(f"Gift with ID {gift_id} not found")
+                raise NotFoundError(f"Gift with ID {gift_id} not found")
             
             # Attempt to steal
             success = gift.steal_gift(new_owner_id)
             
-            if success:
-                # Write back to S3
-                self.write_all_data(participants, gifts, game_state)
-            
-            return success
+            if return_gift:
+                return success, (success, gift)
+            return success, success
         
-        return self._retry_operation(_steal_gift)
+        return self._retry_operation(self._mutate_gift, gift_id, _steal_gift)
     
     def get_gifts(self) -> List[Gift]:
         """Get all gifts."""
-        _, gifts, _ = self.read_all_data()
-        return gifts
+        return self.read_all_data().gifts
     
-    def reset_gift_steals_atomic(self, gift_id: str) -> bool:
+    def reset_gift_steals_atomic(self, gift_id: str,
+                                 return_gift: bool = False) -> Union[bool, Tuple[bool, Gift]]:
         """
         Atomically reset a gift's steal count to 0 (admin override).
         This also unlocks the gift.
         
         Args:
             gift_id: ID of the gift to reset
+            return_gift: Also return the gift as it stands after the operation
             
         Returns:
-            True if gift was reset, False if gift not found
+            True if gift was reset, False if it already had 0 steals.
+            With return_gift, a (was_reset, gift) tuple.
             
         Raises:
             DatabaseError: If gift not found
         """
-        def _reset_gift():
-            participants, gifts, game_state = self.read_all_data()
-            
-            # Find the gift
-            target_gift = None
-            for gift in gifts:
-                if gift.id == gift_id:
-                    target_gift = gift
-                    break
-            
+        def _reset_gift(target_gift):
             if not target_gift:
-                raise DatabaseError(f"Gift with ID '{gift_id}' not found")
+                raise NotFoundError(f"Gift with ID '{gift_id}' not found")
             
             # Reset steal count and unlock
             was_reset = target_gift.reset_steal_count()
             
-            # Write back to S3
-            self.write_all_data(participants, gifts, game_state)
-            
-            return was_reset
+            if return_gift:
+                return was_reset, (was_reset, target_gift)
+            return was_reset, was_reset
         
-        return self._retry_operation(_reset_gift)
+        return self._retry_operation(self._mutate_gift, gift_id, _reset_gift)
     
     def update_gift_name_atomic(self, gift_id: str, new_name: str) -> Gift:
         """
@@ -363,37 +558,24 @@ class S3Database:
         Raises:
             DatabaseError: If gift not found or name is invalid
         """
-        def _update_gift_name():
-            participants, gifts, game_state = self.read_all_data()
-            
+        def _update_gift_name(target_gift):
             # Validate gift name
             if not new_name or not new_name.strip():
-                raise DatabaseError("Gift name cannot be empty")
-            
-            # Find the gift
-            target_gift = None
-            for gift in gifts:
-                if gift.id == gift_id:
-                    target_gift = gift
-                    break
+                raise ValidationError("Gift name cannot be empty")
             
             if not target_gift:
-                raise DatabaseError(f"Gift with ID '{gift_id}' not found")
+                raise NotFoundError(f"Gift with ID '{gift_id}' not found")
             
             # Update the gift name (preserves all other properties)
             target_gift.name = new_name.strip()
             
-            # Write back to S3
-            self.write_all_data(participants, gifts, game_state)
-            
-            return target_gift
+            return True, target_gift
         
-        return self._retry_operation(_update_gift_name)
+        return self._retry_operation(self._mutate_gift, gift_id, _update_gift_name)
     
     def get_game_state(self) -> GameState:
         """Get current game state."""
-        _, _, game_state = self.read_all_data()
-        return game_state
+        return self.read_all_data().game_state
     
     def update_game_state(self, game_state: GameState) -> None:
         """
@@ -402,11 +584,36 @@ class S3Database:
         Args:
             game_state: New game state
         """
-        def _update_game_state():
-            participants, gifts, _ = self.read_all_data()
-            self.write_all_data(participants, gifts, game_state)
+        def _update_game_state(participants, gifts, current_game_state):
+            current_game_state.current_turn = game_state.current_turn
+            current_game_state.turn_order = game_state.turn_order
+            current_game_state.game_phase = game_state.game_phase
+            return True, None
+        
+        return self._retry_operation(self._mutate, _update_game_state)
+    
+    def update_game_state_atomic(self, change: Callable[[List[Participant], GameState], Any]) -> Any:
+        """
+        Atomically read, modify and store the game state.
+        
+        Unlike read_all_data() followed by update_game_state(), a concurrent
+        writer can't slip in between: the write is conditional on the ETag the
+        state was read at, and the change is re-run on conflict.
+        
+        Args:
+            change: Function taking (participants, game_state) that modifies
+                game_state in place and returns a result; raising aborts
+                without writing
+        
+        Returns:
+            The result returned by change
+        """
+        def _update_game_state(participants, gifts, game_state):
+            before = dict(game_state.to_dict(), turn_order=list(game_state.turn_order))
+            result = change(participants, game_state)
+            return game_state.to_dict() != before, result
         
-        return self._retry_operation(_update_game_state)
+        return self._retry_operation(self._mutate, _update_game_state)
     
     def reset_database(self) -> None:
         """
@@ -422,7 +629,6 @@ class S3Database:
                 "game_phase": "registration"
             },
             "metadata": {
-                "last_updated": datetime.now().isoformat(),
                 "version": "1.0"
             }
         }
@@ -2,132 +2,109 @@
 Unit tests for participant registration API endpoints.
 Tests focus on race conditions and concurrent access scenarios.
 """
+import gc
 import pytest
-import json
-import os
-import tempfile
 import threading
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
+import fast_json
 from app import app
-from database import FileDatabase, DatabaseError, ConcurrentAccessError
+from database import FileDatabase, DatabaseError, CapacityExceededError, ConcurrentAccessError
 from models import Participant
 
 
+def post_json(client, path, obj):
+    """POST obj as a JSON body, encoded the way the app encodes responses."""
+    return client.post(path, data=fast_json.dumps(obj), content_type='application/json')
+
+
+@pytest.fixture(scope="module")
+def app_client():
+    """Test client shared by the tests that only patch the database per test."""
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
 class TestParticipantRegistrationAPI:
     """Test cases for participant registration API endpoints."""
     
-    @pytest.fixture
-    def client(self):
-        """Create test client with temporary database."""
-        # Create temporary file for testing
-        self.temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-        self.temp_file.close()
-        
-        # Patch the database to use temporary file
-        with patch('app.db') as mock_db:
-            mock_db.data_file = self.temp_file.name
-            real_db = FileDatabase(self.temp_file.name)
-            mock_db.add_participant_atomic = real_db.add_participant_atomic
-            mock_db.get_participants = real_db.get_participants
-            mock_db.get_participant_count = real_db.get_participant_count
-            
+    @pytest.fixture(scope="class")
+    def registration_db(self, tmp_path_factory):
+        """Create one temporary database patched into the app for the whole class."""
+        # pytest owns the directory, so the data file and its WAL are cleaned up
+        data_file = str(tmp_path_factory.mktemp("registration") / "db.json")
+        
+        # Swap the app over to a database on the temporary file
+        real_db = FileDatabase(data_file)
+        with patch('app.db', real_db):
             app.config['TESTING'] = True
-            with app.test_client() as client:
-                yield client
-        
-        # Cleanup
-        if os.path.exists(self.temp_file.name):
-            os.unlink(self.temp_file.name)
+            yield real_db
+    
+    @pytest.fixture
+    def validation_client(self, app_client, monkeypatch):
+        """Test client over a database stub, for requests rejected before any storage access."""
+        null_db = MagicMock(spec=FileDatabase)
+        monkeypatch.setattr('app.db', null_db)
+        yield app_client
+        assert null_db.method_calls == [], f"Unexpected database calls: {null_db.method_calls}"
+    
+    @pytest.fixture
+    def client(self, registration_db, app_client):
+        """Test client over an emptied database."""
+        registration_db.reset_database()
+        return app_client
     
     def test_register_participant_success(self, client):
         """Test successful participant registration."""
-        response = client.post('/api/participants', 
-                             json={'name': 'John Doe'},
-                             content_type='application/json')
+        response = post_json(client, '/api/participants', {'name': 'John Doe'})
         
         assert response.status_code == 201
-        data = json.loads(response.data)
+        data = response.get_json()
         
         assert 'id' in data
         assert data['name'] == 'John Doe'
         assert 'registration_timestamp' in data
         assert 1 <= data['id'] <= 100
     
-    def test_register_participant_missing_name(self, client):
-        """Test registration with missing name field."""
-        response = client.post('/api/participants', 
-                             json={},
-                             content_type='application/json')
-        
-        assert response.status_code == 400
-        data = json.loads(response.data)
+    @pytest.mark.parametrize("request_kwargs,expected_status,expected_error", [
+        pytest.param({'json': {}}, 400, 'name', id="missing_name"),
+        pytest.param({'json': {'name': ''}}, 400, 'empty', id="empty_name"),
+        pytest.param({'json': {'name': '   '}}, 400, None, id="whitespace_name"),
+        pytest.param({'data': 'name=John', 'content_type': 'application/x-www-form-urlencoded'},
+                     400, 'Content-Type', id="invalid_content_type"),
+        pytest.param({'json': {'name': 123}}, 400, 'string', id="non_string_name"),
+    ])
+    def test_register_participant_invalid_request(self, validation_client, request_kwargs,
+                                                  expected_status, expected_error):
+        """Test registration requests that fail validation."""
+        response = validation_client.post('/api/participants', **request_kwargs)
+        
+        assert response.status_code == expected_status
+        data = response.get_json()
         assert 'error' in data
-        assert 'name' in data['error'].lower()
-    
-    def test_register_participant_empty_name(self, client):
-        """Test registration with empty name."""
-        response = client.post('/api/participants', 
-                             json={'name': ''},
-                             content_type='application/json')
-        
-        assert response.status_code == 400
-        data = json.loads(response.data)
-        assert 'error' in data
-        assert 'empty' in data['error'].lower()
-    
-    def test_register_participant_whitespace_name(self, client):
-        """Test registration with whitespace-only name."""
-        response = client.post('/api/participants', 
-                             json={'name': '   '},
-                             content_type='application/json')
-        
-        assert response.status_code == 400
-        data = json.loads(response.data)
-        assert 'error' in data
-    
-    def test_register_participant_invalid_content_type(self, client):
-        """Test registration with invalid content type."""
-        response = client.post('/api/participants', 
-                             data='name=John',
-                             content_type='application/x-www-form-urlencoded')
-        
-        assert response.status_code == 400
-        data = json.loads(response.data)
-        assert 'Content-Type' in data['error']
-    
-    def test_register_participant_non_string_name(self, client):
-        """Test registration with non-string name."""
-        response = client.post('/api/participants', 
-                             json={'name': 123},
-                             content_type='application/json')
-        
-        assert response.status_code == 400
-        data = json.loads(response.data)
-        assert 'string' in data['error'].lower()
+        if expected_error is not None:
+            assert expected_error in data['error']
     
     def test_get_participants_empty(self, client):
         """Test getting participants when none are registered."""
         response = client.get('/api/participants')
         
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'participants' in data
         assert data['participants'] == []
     
     def test_get_participants_with_data(self, client):
         """Test getting participants after registration."""
         # Register a participant first
-        client.post('/api/participants', 
-                   json={'name': 'Alice'},
-                   content_type='application/json')
+        post_json(client, '/api/participants', {'name': 'Alice'})
         
         response = client.get('/api/participants')
         
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert 'participants' in data
         assert len(data['participants']) == 1
         assert data['participants'][0]['name'] == 'Alice'
@@ -137,60 +114,88 @@ class TestParticipantRegistrationAPI:
         response = client.get('/api/participants/count')
         
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data['count'] == 0
         assert data['max_participants'] == 100
     
-    def test_get_participant_count_with_data(self, client):
+    def test_get_participant_count_with_data(self, client, registration_db):
         """Test getting participant count after registrations."""
-        # Register multiple participants
+        # Register multiple participants straight through the database
         for i in range(3):
-            client.post('/api/participants', 
-                       json={'name': f'User{i}'},
-                       content_type='application/json')
+            registration_db.add_participant_atomic(f'User{i}')
         
         response = client.get('/api/participants/count')
         
         assert response.status_code == 200
-        data = json.loads(response.data)
+        data = response.get_json()
         assert data['count'] == 3
         assert data['max_participants'] == 100
     
-    def test_participants_sorted_by_id(self, client):
+    def test_participants_sorted_by_id(self, client, registration_db):
         """Test that participants are returned sorted by ID."""
         names = ['Charlie', 'Alice', 'Bob']
         
-        # Register participants
+        # Register participants straight through the database
         for name in names:
-            client.post('/api/participants', 
-                       json={'name': name},
-                       content_type='application/json')
+            registration_db.add_participant_atomic(name)
         
         response = client.get('/api/participants')
-        data = json.loads(response.data)
+        data = response.get_json()
         
         # Check that IDs are in ascending order
         ids = [p['id'] for p in data['participants']]
         assert ids == sorted(ids)
+    
+    def test_get_participants_not_modified(self, client):
+        """Test conditional participant retrieval until a new registration."""
+        post_json(client, '/api/participants', {'name': 'Alice'})
+        
+        response = client.get('/api/participants')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        
+        response = client.get('/api/participants', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        
+        post_json(client, '/api/participants', {'name': 'Bob'})
+        
+        response = client.get('/api/participants', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert len(data['participants']) == 2
 
 
 class TestConcurrentRegistration:
     """Test cases for concurrent participant registration scenarios."""
     
     @pytest.fixture
-    def temp_db_file(self):
-        """Create temporary database file for testing."""
-        temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
-        temp_file.close()
-        yield temp_file.name
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
+    def temp_db_file(self, tmp_path):
+        """Path for a temporary database file; pytest removes it and its WAL."""
+        return str(tmp_path / "db.json")
+    
+    @pytest.fixture(scope="class")
+    def shared_db(self, tmp_path_factory):
+        """One database instance for the class's registration tests."""
+        return FileDatabase(str(tmp_path_factory.mktemp("concurrent") / "db.json"))
+    
+    @pytest.fixture
+    def db(self, shared_db):
+        """The shared database, emptied for this test."""
+        shared_db.reset_database()
+        return shared_db
     
-    def test_concurrent_registration_unique_numbers(self, temp_db_file):
+    @pytest.fixture
+    def gc_paused(self):
+        """Pause cyclic garbage collection so no collection lands among the contending threads."""
+        gc.collect()
+        gc.disable()
+        yield
+        gc.enable()
+    
+    def test_concurrent_registration_unique_numbers(self, db, gc_paused):
         """Test that concurrent registrations get unique participant numbers."""
-        db = FileDatabase(temp_db_file)
         num_threads = 10
-        results = []
         errors = []
         
         def register_participant(name):
@@ -203,12 +208,7 @@ class TestConcurrentRegistration:
         
         # Run concurrent registrations
         with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = [executor.submit(register_participant, i) for i in range(num_threads)]
-            
-            for future in as_completed(futures):
-                result = future.result()
-                if result is not None:
-                    results.append(result)
+            results = [r for r in executor.map(register_participant, range(num_threads)) if r is not None]
         
         # Verify all registrations succeeded
         assert len(errors) == 0, f"Errors occurred: {errors}"
@@ -221,37 +221,31 @@ class TestConcurrentRegistration:
         for num in results:
             assert 1 <= num <= 100
     
-    def test_concurrent_registration_race_condition_simulation(self, temp_db_file):
+    def test_concurrent_registration_race_condition_simulation(self, db, gc_paused):
         """Test registration under simulated race conditions."""
-        db = FileDatabase(temp_db_file)
         num_threads = 20
         successful_registrations = []
         failed_registrations = []
+        results_lock = threading.Lock()
+        # Release every thread at once so the registrations actually collide
+        barrier = threading.Barrier(num_threads)
         
-        def register_with_delay(thread_id):
+        def register_together(thread_id):
             try:
-                # Add small random delay to increase chance of race conditions
-                time.sleep(0.001 * (thread_id % 3))
+                barrier.wait(timeout=5.0)
                 participant = db.add_participant_atomic(f"RaceUser_{thread_id}")
-                successful_registrations.append(participant.id)
+                with results_lock:
+                    successful_registrations.append(participant.id)
                 return True
             except Exception as e:
-                failed_registrations.append(str(e))
+                with results_lock:
+                    failed_registrations.append(str(e))
                 return False
         
-        # Run concurrent registrations
-        threads = []
-        for i in range(num_threads):
-            thread = threading.Thread(target=register_with_delay, args=(i,))
-            threads.append(thread)
-        
-        # Start all threads simultaneously
-        for thread in threads:
-            thread.start()
-        
-        # Wait for all threads to complete
-        for thread in threads:
-            thread.join()
+        # Run concurrent registrations; the barrier holds every task until
+        # the pool has a worker for each, so none start early
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            list(executor.map(register_together, range(num_threads)))
         
         # Verify results
         assert len(successful_registrations) == num_threads, f"Expected {num_threads} successful registrations, got {len(successful_registrations)}"
@@ -260,13 +254,12 @@ class TestConcurrentRegistration:
         # Verify unique numbers
         assert len(set(successful_registrations)) == len(successful_registrations)
     
-    def test_registration_limit_enforcement(self, temp_db_file):
+    def test_registration_limit_enforcement(self, db, gc_paused):
         """Test that registration limit is properly enforced under concurrent access."""
-        db = FileDatabase(temp_db_file)
-        
-        # Pre-register 98 participants to approach the limit
-        for i in range(98):
-            db.add_participant_atomic(f"PreUser_{i}")
+        # Seed 98 participants in one write to approach the limit
+        with db.batch():
+            for i in range(98):
+                db.add_participant_atomic(f"PreUser_{i}")
         
         # Now try to register 5 more participants concurrently (only 2 should succeed)
         num_threads = 5
@@ -287,10 +280,7 @@ class TestConcurrentRegistration:
         
         # Run concurrent registrations
         with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = [executor.submit(register_participant, i) for i in range(num_threads)]
-            
-            for future in as_completed(futures):
-                future.result()
+            list(executor.map(register_participant, range(num_threads)))
         
         # Verify exactly 2 succeeded and 3 failed due to limit
         assert len(successful_registrations) == 2, f"Expected 2 successful registrations, got {len(successful_registrations)}"
@@ -328,60 +318,52 @@ class TestConcurrentRegistration:
 class TestAPIErrorHandling:
     """Test cases for API error handling scenarios."""
     
-    def test_database_error_handling(self):
-        """Test API response to database errors."""
-        app.config['TESTING'] = True
-        
-        with app.test_client() as client:
-            with patch('app.db.add_participant_atomic') as mock_add:
-                # Simulate database error
-                mock_add.side_effect = DatabaseError("Test database error")
-                
-                response = client.post('/api/participants', 
-                                     json={'name': 'Test User'},
-                                     content_type='application/json')
-                
-                assert response.status_code == 400
-                data = json.loads(response.data)
-                assert 'error' in data
+    @pytest.mark.parametrize("error,expected_status,expected_error,expected_code", [
+        pytest.param(DatabaseError("Test database error"), 500, None, 'DATABASE_ERROR',
+                     id="database_error"),
+        pytest.param(ConcurrentAccessError("Concurrent access conflict"), 503, 'try again', None,
+                     id="concurrent_access"),
+        pytest.param(CapacityExceededError("Maximum number of participants (100) reached"), 409, 'maximum',
+                     'CAPACITY_EXCEEDED', id="registration_full"),
+    ])
+    def test_error_mapping(self, app_client, monkeypatch, error, expected_status, expected_error,
+                           expected_code):
+        """Test API responses to errors raised while registering."""
+        monkeypatch.setattr('app.db.add_participant_atomic', MagicMock(side_effect=error))
+        
+        response = post_json(app_client, '/api/participants', {'name': 'Test User'})
+        
+        assert response.status_code == expected_status
+        data = response.get_json()
+        assert 'error' in data
+        if expected_error is not None:
+            assert expected_error in data['error'].lower()
+        if expected_code is not None:
+            assert data['error_code'] == expected_code
     
-    def test_concurrent_access_error_handling(self):
-        """Test API response to concurrent access errors."""
-        app.config['TESTING'] = True
-        
-        with app.test_client() as client:
-            # Import the app module to patch the db instance
-            import app as app_module
-            with patch.object(app_module, 'db') as mock_db:
-                # Simulate concurrent access error
-                mock_db.add_participant_atomic.side_effect = ConcurrentAccessError("Concurrent access conflict")
-                
-                response = client.post('/api/participants', 
-                                     json={'name': 'Test User'},
-                                     content_type='application/json')
-                
-                assert response.status_code == 503
-                data = json.loads(response.data)
-                assert 'error' in data
-                assert 'try again' in data['error'].lower()
+    def test_database_error_status_follows_error_type(self, app_client, monkeypatch):
+        """Test database errors are classified by type, not message wording."""
+        monkeypatch.setattr('app.db.add_participant_atomic',
+                            MagicMock(side_effect=CapacityExceededError("Registration closed")))
+        
+        response = post_json(app_client, '/api/participants', {'name': 'Test User'})
+        
+        assert response.status_code == 409
+        data = response.get_json()
+        assert data['error_code'] == 'CAPACITY_EXCEEDED'
     
-    def test_registration_full_error(self):
-        """Test API response when registration is full."""
-        app.config['TESTING'] = True
-        
-        with app.test_client() as client:
-            with patch('app.db.add_participant_atomic') as mock_add:
-                # Simulate registration full error
-                mock_add.side_effect = DatabaseError("Maximum number of participants (100) reached")
-                
-                response = client.post('/api/participants', 
-                                     json={'name': 'Test User'},
-                                     content_type='application/json')
-                
-                assert response.status_code == 409  # Conflict
-                data = json.loads(response.data)
-                assert 'error' in data
-                assert 'maximum' in data['error'].lower()
+    def test_database_error_subclass_uses_parent_status(self, app_client, monkeypatch):
+        """Test subclasses of mapped database errors get their parent's status."""
+        class RegistrationClosedError(CapacityExceededError):
+            pass
+        
+        monkeypatch.setattr('app.db.add_participant_atomic',
+                            MagicMock(side_effect=RegistrationClosedError("Registration closed")))
+        
+        response = post_json(app_client, '/api/participants', {'name': 'Test User'})
+        
+        assert response.status_code == 409
+        assert response.get_json()['error_code'] == 'CAPACITY_EXCEEDED'
 
 
 if __name__ == '__main__':
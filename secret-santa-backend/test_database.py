@@ -8,6 +8,7 @@ import json
 import threading
 import time
 from unittest.mock import patch, mock_open
+import database
 from database import FileDatabase, DatabaseError, ConcurrentAccessError
 from models import Participant, Gift, GameState
 
@@ -26,9 +27,10 @@ class TestFileDatabase(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment."""
-        # Remove temporary file
-        if os.path.exists(self.temp_file.name):
-            os.unlink(self.temp_file.name)
+        # Remove temporary file and its write-ahead log
+        for path in (self.temp_file.name, self.temp_file.name + '.wal'):
+            if os.path.exists(path):
+                os.unlink(path)
     
     def test_database_initialization(self):
         """Test database initialization creates file with correct structure."""
@@ -211,6 +213,19 @@ class TestFileDatabase(unittest.TestCase):
         self.assertTrue(final_gift.is_locked)
         self.assertEqual(final_gift.current_owner, 4)
     
+    def test_no_op_gift_changes_skip_write_lock(self):
+        """Test refused steals and same-name renames are answered without committing."""
+        gift = self.db.add_gift("Scarf", 1)
+        for owner in (2, 3, 4):
+            self.db.steal_gift_atomic(gift.id, owner)
+        
+        with patch.object(self.db, '_mutate', side_effect=AssertionError("write path taken")):
+            self.assertFalse(self.db.steal_gift_atomic(gift.id, 5))
+            success, locked_gift = self.db.steal_gift_atomic(gift.id, 5, return_gift=True)
+            self.assertFalse(success)
+            self.assertEqual(locked_gift.current_owner, 4)
+            self.assertEqual(self.db.update_gift_name_atomic(gift.id, " Scarf ").name, "Scarf")
+    
     def test_steal_gift_not_found(self):
         """Test stealing non-existent gift raises error."""
         with self.assertRaises(DatabaseError) as context:
@@ -249,6 +264,27 @@ class TestFileDatabase(unittest.TestCase):
         self.assertEqual(updated_state.current_turn, 5)
         self.assertEqual(updated_state.turn_order, [5, 3, 1])
     
+    def test_update_game_state_atomic(self):
+        """Test atomic read-modify-write of the game state."""
+        alice = self.db.add_participant_atomic("Alice")
+        
+        def start(participants, game_state):
+            game_state.set_turn_order([p.id for p in participants])
+            game_state.start_game()
+            return game_state.current_turn
+        
+        self.assertEqual(self.db.update_game_state_atomic(start), alice.id)
+        self.assertEqual(self.db.get_game_state().game_phase, "active")
+        
+        # A change that raises is not stored
+        def fail(participants, game_state):
+            game_state.game_phase = "completed"
+            raise DatabaseError("abort")
+        
+        with self.assertRaises(DatabaseError):
+            self.db.update_game_state_atomic(fail)
+        self.assertEqual(self.db.get_game_state().game_phase, "active")
+    
     def test_write_all_data(self):
         """Test writing all data at once."""
         # Create test data
@@ -327,6 +363,24 @@ class TestFileDatabase(unittest.TestCase):
             
             self.assertIn("failed after 2 attempts", str(context.exception))
     
+    def test_retry_backoff_is_capped(self):
+        """Test a slow failing attempt doesn't stretch the retry waits without bound."""
+        db = FileDatabase(self.temp_file.name, max_retries=3, retry_delay=0.001)
+        sleeps = []
+        clock = iter(range(0, 10000, 60))  # every attempt appears to take a minute
+        
+        def failing():
+            raise OSError("Slow failure")
+        
+        with patch('database.time.monotonic', side_effect=lambda: next(clock)), \
+                patch('database.time.sleep', side_effect=sleeps.append):
+            with self.assertRaises(ConcurrentAccessError):
+                db._retry_operation(failing)
+        
+        # The first retry only yields; the second backs off by up to one slot
+        self.assertEqual(len(sleeps), 1)
+        self.assertLessEqual(sleeps[0], FileDatabase.MAX_RETRY_SLOT)
+    
     def test_update_gift_name_atomic(self):
         """Test atomic gift name update."""
         # Add a gift
@@ -426,6 +480,205 @@ class TestFileDatabase(unittest.TestCase):
         updated_gift = self.db.update_gift_name_atomic(gift.id, "  Trimmed Name  ")
         
         self.assertEqual(updated_gift.name, "Trimmed Name")
+    
+    def test_pick_free_number(self):
+        """Test free participant numbers are picked from the unused ones."""
+        self.assertEqual(database.pick_free_number(i for i in range(1, 101) if i != 42), 42)
+        for _ in range(20):
+            self.assertIn(database.pick_free_number([1, 2, 3]), range(4, 101))
+        with self.assertRaises(DatabaseError):
+            database.pick_free_number(range(1, 101))
+    
+    def test_new_gift_id(self):
+        """Test gift IDs are short hex strings that skip taken ones."""
+        gift_id = self.db.add_gift("Book").id
+        self.assertRegex(gift_id, r'^[0-9a-f]{12}$')
+        with patch('database.random.getrandbits', side_effect=[1, 1, 2]):
+            self.assertEqual(database.new_gift_id({'000000000001'}), '000000000002')
+    
+    def test_state_tracks_used_numbers(self):
+        """Test the in-memory used-number mask follows registrations."""
+        ids = {self.db.add_participant_atomic(f"P{i}").id for i in range(10)}
+        state = self.db._load_state()
+        self.assertEqual(state.used_mask, database.number_mask(ids))
+        self.assertEqual(FileDatabase(self.temp_file.name)._load_state().used_mask, state.used_mask)
+    
+    def test_mutations_append_to_wal(self):
+        """Test mutations are logged to the WAL and replayed by a new instance."""
+        with open(self.temp_file.name, 'rb') as f:
+            snapshot = f.read()
+        
+        gift = self.db.add_gift("Book", 1)
+        self.db.steal_gift_atomic(gift.id, 2)
+        
+        # The snapshot is untouched; the changes live in the log
+        with open(self.temp_file.name, 'rb') as f:
+            self.assertEqual(f.read(), snapshot)
+        self.assertGreater(os.path.getsize(self.db.wal_file), 0)
+        
+        gifts = FileDatabase(self.temp_file.name).get_gifts()
+        self.assertEqual(len(gifts), 1)
+        self.assertEqual(gifts[0].current_owner, 2)
+        self.assertEqual(gifts[0].steal_history, [1])
+    
+    def test_wal_logs_changed_fields_only(self):
+        """Test updates to existing gifts log only the fields that changed."""
+        gift = self.db.add_gift("Book", 1)
+        self.db.update_gift_name_atomic(gift.id, "Novel")
+        
+        with open(self.db.wal_file, 'rb') as f:
+            last = json.loads(f.read().splitlines()[-1])
+        self.assertEqual(last, {"op": "gift_update", "id": gift.id, "data": {"name": "Novel"}})
+        
+        gifts = FileDatabase(self.temp_file.name).get_gifts()
+        self.assertEqual(gifts[0].name, "Novel")
+        self.assertEqual(gifts[0].current_owner, 1)
+    
+    def test_reads_reuse_wal_handle(self):
+        """Test lock-free reads share one WAL handle and see other writers."""
+        writer = FileDatabase(self.temp_file.name)
+        writer.add_participant_atomic("Alice")
+        self.assertEqual(self.db.get_participant_count(), 1)
+        handle = self.db._wal_reader[1]
+        
+        writer.add_participant_atomic("Bob")
+        self.assertEqual(self.db.get_participant_count(), 2)
+        self.assertIs(self.db._wal_reader[1], handle)
+        
+        # A replaced log is reopened (the records in the deleted one are lost)
+        os.unlink(self.db.wal_file)
+        writer.add_participant_atomic("Carol")
+        self.assertEqual([p.name for p in self.db.get_participants()], ["Carol"])
+        self.assertIsNot(self.db._wal_reader[1], handle)
+
+    def test_version_shared_across_instances(self):
+        """Test the version depends only on the files, and changes on every write."""
+        self.db.add_participant_atomic("Alice")
+        version = self.db.get_version()
+        self.assertEqual(FileDatabase(self.temp_file.name).get_version(), version)
+
+        self.db.add_gift("Book")
+        self.assertNotEqual(self.db.get_version(), version)
+
+    def test_group_commit_batch(self):
+        """Test a batch of queued changes is committed in order, failures isolated."""
+        def add(name):
+            gift = Gift(name, name)
+            return lambda state: ([{"op": "gift", "data": gift.to_dict()}], len(state.gifts))
+        
+        def fail(state):
+            raise DatabaseError("rejected")
+        
+        batch = [database._WriteRequest(add("a"), False),
+                 database._WriteRequest(fail, False),
+                 database._WriteRequest(add("b"), False)]
+        self.db._commit_batch(batch)
+        
+        self.assertTrue(all(request.done for request in batch))
+        self.assertEqual([batch[0].result, batch[2].result], [0, 1])
+        self.assertIsInstance(batch[1].error, DatabaseError)
+        gifts = FileDatabase(self.temp_file.name).get_gifts()
+        self.assertEqual(sorted(g.name for g in gifts), ["a", "b"])
+    
+    def test_batch_commits_once(self):
+        """Test changes made in batch() are visible to the thread and written together on exit."""
+        self.db.add_participant_atomic("Before")
+        wal_size = os.path.getsize(self.db.wal_file)
+        
+        with self.db.batch():
+            for i in range(5):
+                self.db.add_participant_atomic(f"User {i}")
+            self.assertEqual(self.db.get_participant_count(), 6)
+            self.assertEqual(os.path.getsize(self.db.wal_file), wal_size)
+        
+        self.assertEqual(FileDatabase(self.temp_file.name).get_participant_count(), 6)
+        
+        with self.assertRaises(RuntimeError):
+            with self.db.batch():
+                self.db.add_gift("Discarded")
+                raise RuntimeError("abort")
+        self.assertEqual(FileDatabase(self.temp_file.name).get_gifts(), [])
+        self.assertEqual(self.db.get_gifts(), [])
+    
+    def test_wal_compaction(self):
+        """Test the WAL is folded into the snapshot once it grows too large."""
+        with patch.object(database, 'COMPACTION_MIN_BYTES', 0), \
+                patch.object(database, 'COMPACTION_RATIO', 1):
+            for i in range(5):
+                self.db.add_gift(f"Gift {i}")
+        
+        with open(self.temp_file.name, 'r') as f:
+            data = json.load(f)
+        self.assertGreater(len(data['gifts']), 0)
+        
+        gifts = FileDatabase(self.temp_file.name).get_gifts()
+        self.assertEqual([g.name for g in gifts], [f"Gift {i}" for i in range(5)])
+
+    def test_failed_compaction_does_not_fail_write(self):
+        """Test a write whose records are durable succeeds even if compaction fails."""
+        self.db.add_gift("Book")
+        with patch.object(database, 'COMPACTION_MIN_BYTES', 0), \
+                patch.object(database, 'COMPACTION_RATIO', 0), \
+                patch.object(self.db, '_atomic_write_json', side_effect=OSError("No space left")):
+            self.db.add_participant_atomic("Alice")
+
+        participants = FileDatabase(self.temp_file.name).get_participants()
+        self.assertEqual([p.name for p in participants], ["Alice"])
+
+    def test_wal_ignored_after_snapshot_replaced(self):
+        """Test a log left over from an older snapshot is not replayed."""
+        self.db.add_participant_atomic("Alice")
+        
+        os.unlink(self.temp_file.name)
+        db = FileDatabase(self.temp_file.name)
+        self.assertEqual(db.get_participant_count(), 0)
+        
+        db.add_participant_atomic("Bob")
+        participants = FileDatabase(self.temp_file.name).get_participants()
+        self.assertEqual([p.name for p in participants], ["Bob"])
+    
+    def test_wal_torn_write_ignored(self):
+        """Test a partially written record at the end of the WAL is dropped."""
+        self.db.add_gift("Book")
+        with open(self.db.wal_file, 'ab') as f:
+            f.write(b'{"op": "gift", "da')
+        
+        db = FileDatabase(self.temp_file.name)
+        self.assertEqual(len(db.get_gifts()), 1)
+        
+        db.add_gift("Mug")
+        gifts = FileDatabase(self.temp_file.name).get_gifts()
+        self.assertEqual([g.name for g in gifts], ["Book", "Mug"])
+
+    def test_failed_wal_sync_rolls_back_records(self):
+        """Test records whose sync failed are removed before the change is retried."""
+        with patch.object(database, '_sync_wal', side_effect=[OSError("I/O error"), None]):
+            self.db.add_participant_atomic("Alice")
+
+        participants = FileDatabase(self.temp_file.name).get_participants()
+        self.assertEqual([p.name for p in participants], ["Alice"])
+
+    def test_failed_wal_rollback_is_not_retried(self):
+        """Test a write that can't be rolled back fails without a retry."""
+        self.db.add_gift("Book")
+        with patch.object(database, '_sync_wal', side_effect=OSError("I/O error")), \
+                patch.object(database, '_fdatasync', side_effect=OSError("I/O error")):
+            with self.assertRaises(DatabaseError):
+                self.db.add_participant_atomic("Alice")
+
+    def test_wal_unreadable_record_ignored(self):
+        """Test replay stops at a complete record that can't be applied."""
+        self.db.add_gift("Book")
+        with open(self.db.wal_file, 'ab') as f:
+            f.write(b'{"op": "gift_update", "id": "missing", "data": {}}\n')
+            f.write(b'not json\n')
+
+        db = FileDatabase(self.temp_file.name)
+        self.assertEqual(len(db.get_gifts()), 1)
+
+        db.add_gift("Mug")
+        gifts = FileDatabase(self.temp_file.name).get_gifts()
+        self.assertEqual([g.name for g in gifts], ["Book", "Mug"])
 
 
 class TestDatabaseConcurrency(unittest.TestCase):
@@ -441,8 +694,23 @@ class TestDatabaseConcurrency(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test environment."""
-        if os.path.exists(self.temp_file.name):
-            os.unlink(self.temp_file.name)
+        for path in (self.temp_file.name, self.db.wal_file):
+            if os.path.exists(path):
+                os.unlink(path)
+    
+    def test_reads_do_not_wait_for_writers(self):
+        """Test a reader is not blocked by a writer holding the exclusive lock."""
+        self.db.add_participant_atomic("Alice")
+        reader = FileDatabase(self.temp_file.name)
+        results = []
+        
+        with self.db._file_lock(database.fcntl.LOCK_EX):
+            thread = threading.Thread(target=lambda: results.append(reader.get_participants()))
+            thread.start()
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+        
+        self.assertEqual([p.name for p in results[0]], ["Alice"])
     
     def test_concurrent_gift_stealing(self):
         """Test gift stealing mechanics with sequential operations."""
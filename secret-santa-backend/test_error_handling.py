@@ -14,8 +14,10 @@ from error_handlers import (
     validate_participant_name, 
     validate_gift_name, 
     validate_participant_id,
-    register_error_handlers
+    register_error_handlers,
+    log_traceback
 )
+import error_handlers
 from database import DatabaseError, ConcurrentAccessError
 
 
@@ -141,6 +143,21 @@ class TestValidationFunctions:
             validate_participant_id(101)
         
         assert exc_info.value.error_code == "INVALID_PARTICIPANT_ID_RANGE"
+    
+    def test_validate_participant_id_cached_errors_still_raise(self):
+        """Test memoized validation keeps raising for invalid values."""
+        assert validate_participant_id(7) == 7
+        assert validate_participant_id(7) == 7
+        
+        for _ in range(2):
+            with pytest.raises(APIError) as exc_info:
+                validate_participant_id(0)
+            assert exc_info.value.error_code == "INVALID_PARTICIPANT_ID_RANGE"
+        
+        # A float equal to a cached int must not reuse the int result
+        with pytest.raises(APIError) as exc_info:
+            validate_participant_id(7.0)
+        assert exc_info.value.error_code == "INVALID_PARTICIPANT_ID_TYPE"
 
 
 class TestErrorHandlers:
@@ -153,6 +170,16 @@ class TestErrorHandlers:
         with app.test_client() as client:
             yield client
     
+    def test_log_traceback_formats_in_background(self, caplog):
+        """Test tracebacks are logged by the background worker."""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            log_traceback()
+        
+        error_handlers._traceback_queue.join()
+        assert any('ValueError: boom' in record.getMessage() for record in caplog.records)
+    
     def test_api_error_handler(self, client):
         """Test APIError handler."""
         with app.app_context():
@@ -290,6 +317,16 @@ class TestEnhancedAPIEndpoints:
         assert data['error_code'] == "MISSING_FIELDS"
         assert 'name' in data['details']['missing_fields']
     
+    def test_register_participant_null_name_or_non_object_body(self, client):
+        """Test null required fields and non-object bodies are missing fields."""
+        for body in ({'name': None}, ['name']):
+            response = client.post('/api/participants', json=body)
+            
+            assert response.status_code == 400
+            data = json.loads(response.data)
+            assert data['error_code'] == "MISSING_FIELDS"
+            assert data['details']['missing_fields'] == ['name']
+    
     def test_register_participant_invalid_name_type(self, client):
         """Test participant registration with invalid name type."""
         response = client.post('/api/participants', 
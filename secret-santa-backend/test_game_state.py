@@ -103,6 +103,40 @@ class TestCurrentTurnEndpoint:
         
         assert data1['turn_order'] == data2['turn_order']
         assert len(data1['turn_order']) == 2
+    
+    def test_get_current_turn_does_not_persist_turn_order(self, client):
+        """Test that polling the current turn never writes to the database."""
+        import app as app_module
+        
+        client.post('/api/participants', json={'name': 'Alice'})
+        client.post('/api/participants', json={'name': 'Bob'})
+        
+        response = client.get('/api/game/current-turn')
+        assert response.status_code == 200
+        assert len(json.loads(response.data)['turn_order']) == 2
+        
+        # The stored game state is untouched until the game is started
+        game_state = app_module.db.get_game_state()
+        assert game_state.turn_order == []
+        assert game_state.current_turn is None
+    
+    def test_get_current_turn_not_modified(self, client):
+        """Test conditional current turn polling until the game state changes."""
+        client.post('/api/participants', json={'name': 'Alice'})
+        client.post('/api/participants', json={'name': 'Bob'})
+        
+        response = client.get('/api/game/current-turn')
+        etag = response.headers['ETag']
+        
+        response = client.get('/api/game/current-turn', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        client.put('/api/game/start')
+        
+        response = client.get('/api/game/current-turn', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['game_phase'] == 'active'
 
 
 class TestAdvanceTurnEndpoint:
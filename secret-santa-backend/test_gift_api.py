@@ -29,6 +29,7 @@ def client():
         mock_db.steal_gift_atomic = real_db.steal_gift_atomic
         mock_db.add_participant_atomic = real_db.add_participant_atomic
         mock_db.update_gift_name_atomic = real_db.update_gift_name_atomic
+        mock_db.get_version = real_db.get_version
         
         app.config['TESTING'] = True
         with app.test_client() as client:
@@ -151,6 +152,27 @@ class TestGiftRetrieval:
         gift_names = [g['name'] for g in data['gifts']]
         assert 'Gift 1' in gift_names
         assert 'Gift 2' in gift_names
+    
+    def test_get_gifts_not_modified(self, client):
+        """Test conditional gift retrieval until the gift pool changes."""
+        client.post('/api/gifts', json={'name': 'Gift 1'})
+        
+        response = client.get('/api/gifts')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert etag.startswith('W/')
+        
+        # Unchanged pool: empty 304 response
+        response = client.get('/api/gifts', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        
+        # Any write invalidates the tag
+        client.post('/api/gifts', json={'name': 'Gift 2'})
+        response = client.get('/api/gifts', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert len(data['gifts']) == 2
 
 
 class TestGiftStealing:
@@ -3,7 +3,7 @@ Unit tests for data models.
 """
 import unittest
 from datetime import datetime
-from models import Participant, Gift, GameState
+from models import Participant, Gift, GameState, Snapshot
 
 
 class TestParticipant(unittest.TestCase):
@@ -36,6 +36,16 @@ class TestParticipant(unittest.TestCase):
         }
         self.assertEqual(data, expected)
     
+    def test_participant_to_dict_cache_invalidation(self):
+        """Test cached participant dictionary is rebuilt after a change."""
+        participant = Participant(3, "Bob Johnson", "2023-12-01T10:00:00")
+        first = participant.to_dict()
+        
+        self.assertIs(participant.to_dict(), first)
+        
+        participant.name = "Robert Johnson"
+        self.assertEqual(participant.to_dict()["name"], "Robert Johnson")
+    
     def test_participant_from_dict(self):
         """Test participant deserialization from dictionary."""
         data = {
@@ -152,6 +162,23 @@ class TestGift(unittest.TestCase):
         }
         self.assertEqual(data, expected)
     
+    def test_gift_to_dict_cache_invalidation(self):
+        """Test cached gift dictionary reflects steals, resets and renames."""
+        gift = Gift("gift-7", "Book", current_owner=1)
+        self.assertEqual(gift.to_dict()["steal_count"], 0)
+        
+        gift.steal_gift(2)
+        data = gift.to_dict()
+        self.assertEqual(data["steal_count"], 1)
+        self.assertEqual(data["current_owner"], 2)
+        self.assertEqual(data["steal_history"], [1])
+        
+        gift.reset_steal_count()
+        self.assertEqual(gift.to_dict()["steal_count"], 0)
+        
+        gift.name = "Novel"
+        self.assertEqual(gift.to_dict()["name"], "Novel")
+    
     def test_gift_from_dict(self):
         """Test gift deserialization from dictionary."""
         data = {
@@ -171,6 +198,21 @@ class TestGift(unittest.TestCase):
         self.assertEqual(gift.current_owner, 9)
         self.assertEqual(gift.steal_history, [2])
     
+    def test_gift_from_dict_reuses_complete_record(self):
+        """Test a complete record serves as the dictionary form until a change."""
+        data = Gift("gift-10", "Mug", current_owner=3).to_dict()
+        gift = Gift.from_dict(data)
+        self.assertIs(gift.to_dict(), data)
+        
+        gift.steal_gift(4)
+        self.assertEqual(gift.to_dict()["current_owner"], 4)
+        self.assertEqual(data["current_owner"], 3)
+        self.assertEqual(data["steal_history"], [])
+        
+        # Incomplete records are normalized rather than reused
+        partial = {"id": "gift-11", "name": "Pen"}
+        self.assertEqual(Gift.from_dict(partial).to_dict()["steal_history"], [])
+    
     def test_gift_repr(self):
         """Test gift string representation."""
         gift = Gift("gift-9", "Plant Pot")
@@ -275,6 +317,18 @@ class TestGameState(unittest.TestCase):
         self.assertEqual(game_state.game_phase, "active")
         self.assertIsNone(game_state.current_turn)
     
+    def test_turn_changes_follow_direct_assignment(self):
+        """Test turn navigation stays correct when current_turn is set directly."""
+        game_state = GameState()
+        game_state.set_turn_order([5, 8, 2, 9])
+        game_state.start_game()
+        self.assertEqual(game_state.next_turn(), 8)
+        
+        game_state.current_turn = 2
+        self.assertEqual(game_state.next_turn(), 9)
+        self.assertEqual(game_state.previous_turn(), 2)
+        self.assertEqual(game_state.previous_turn(), 8)
+    
     def test_game_state_to_dict(self):
         """Test game state serialization to dictionary."""
         game_state = GameState()
@@ -328,5 +382,35 @@ class TestGameState(unittest.TestCase):
         self.assertIn("participants=3", repr_str)
 
 
+class TestSnapshot(unittest.TestCase):
+    """Test cases for Snapshot model."""
+    
+    def setUp(self):
+        """Set up snapshot data."""
+        self.participant_data = [Participant(1, "Alice").to_dict(), Participant(2, "Bob").to_dict()]
+        self.gift_data = [Gift("gift-1", "Book", 1).to_dict()]
+        self.game_state_data = {"current_turn": 1, "turn_order": [1, 2], "game_phase": "active"}
+    
+    def test_snapshot_unpacks_like_tuple(self):
+        """Test a snapshot unpacks into participants, gifts and game state."""
+        participants, gifts, game_state = Snapshot(self.participant_data, self.gift_data, self.game_state_data)
+        
+        self.assertEqual([p.name for p in participants], ["Alice", "Bob"])
+        self.assertEqual(gifts[0].name, "Book")
+        self.assertEqual(game_state.current_turn, 1)
+    
+    def test_snapshot_builds_models_lazily(self):
+        """Test models are only built for the parts that are accessed."""
+        snapshot = Snapshot(self.participant_data, self.gift_data, self.game_state_data)
+        
+        self.assertEqual(snapshot.gift_count, 1)
+        self.assertIs(snapshot.participants, snapshot.participants)
+        self.assertIsNone(snapshot._gifts)
+        
+        # Mutating a model must not leak into the stored data
+        snapshot.game_state.turn_order.append(3)
+        self.assertEqual(self.game_state_data["turn_order"], [1, 2])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file